@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
 import os
-import tempfile
 import zipfile
 import time
 import threading
 from datetime import datetime
 from utils.excel_processor import ExcelProcessor
-from utils.document_generator import DocumentGenerator
+from utils.document_generator import DocumentGenerator, warm_up_render_pool, warm_up_renderer
+from utils.cache import ParseCache, RenderCache
+from utils.workspace import get_workspace
 from utils.formatters import format_currency, format_date, format_number
 
 # Page configuration
@@ -175,6 +176,57 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_parse_cache():
+    """Process-wide cache of parsed workbooks, shared by all sessions
+
+    Set PARSE_CACHE_DIR to also keep results on disk (PARSE_CACHE_DISK_MB caps its size).
+    """
+    return ParseCache(
+        max_entries=int(os.environ.get('PARSE_CACHE_ENTRIES', 32)),
+        disk_dir=os.environ.get('PARSE_CACHE_DIR') or None,
+        max_disk_bytes=int(os.environ.get('PARSE_CACHE_DISK_MB', 256)) * 1024 * 1024
+    )
+
+@st.cache_resource
+def get_render_cache():
+    """Process-wide cache of rendered documents, shared by all sessions
+
+    RENDER_CACHE_ENTRIES and RENDER_CACHE_MEMORY_MB bound the memory tier.
+    Set RENDER_CACHE_DIR to also keep outputs on disk (RENDER_CACHE_DISK_MB caps its size).
+    """
+    return RenderCache(
+        max_entries=int(os.environ.get('RENDER_CACHE_ENTRIES', 256)),
+        disk_dir=os.environ.get('RENDER_CACHE_DIR') or None,
+        max_disk_bytes=int(os.environ.get('RENDER_CACHE_DISK_MB', 512)) * 1024 * 1024,
+        max_memory_bytes=int(os.environ.get('RENDER_CACHE_MEMORY_MB', 128)) * 1024 * 1024
+    )
+
+@st.cache_resource
+def start_render_pool():
+    """Start the document render workers once per server process"""
+    warm_up_render_pool()
+    # The combined PDF is rendered in this process; load fonts without blocking the page
+    threading.Thread(target=warm_up_renderer, daemon=True).start()
+    return True
+
+# Formats the user can have rendered together with the documents
+PREPARED_FORMAT_LABELS = {'pdf': 'PDF', 'docx': 'Word'}
+
+def get_session_job():
+    """Workspace job holding this session's generated files, replaced once it has expired"""
+    job = st.session_state.get('workspace_job')
+    if job is None or job.closed:
+        job = get_workspace().create_job('session')
+        st.session_state.workspace_job = job
+    job.touch()
+    return job
+
+def parse_workbook(file_buffer):
+    """Run ExcelProcessor on the uploaded workbook straight from memory"""
+    processor = ExcelProcessor()
+    return processor.process_file(file_buffer)
+
 def main():
     # Professional header with crane logo and gradient background
     st.markdown("""
@@ -205,6 +257,14 @@ def main():
     if 'efficiency_score' not in st.session_state:
         st.session_state.efficiency_score = 0
     
+    # Generated files live as long as the session's workspace job; each rerun keeps it alive
+    job = st.session_state.get('workspace_job')
+    if job is not None and not job.closed:
+        job.touch()
+    elif st.session_state.generated_files:
+        st.session_state.generated_files = {}
+        st.session_state.processing_complete = False
+    
     # Display real-time performance dashboard
     display_performance_dashboard()
     
@@ -217,12 +277,33 @@ def main():
             help="Upload your contractor bill Excel file. The system will automatically detect the format (Old Pattern or New Pattern with Title sheet)."
         )
         
+        # Formats rendered with the documents; the others are prepared on first download
+        prepared_formats = st.multiselect(
+            "Prepare Up Front",
+            options=list(PREPARED_FORMAT_LABELS),
+            default=['pdf'],
+            format_func=PREPARED_FORMAT_LABELS.get,
+            help="HTML is always generated. Other formats are generated the first time you download them."
+        )
+        
         if uploaded_file is not None:
             st.success("✅ File uploaded successfully!")
             
             # Display file info
             st.info(f"**File Name:** {uploaded_file.name}")
             st.info(f"**File Size:** {uploaded_file.size / 1024:.2f} KB")
+            
+            cache_stats = get_parse_cache().stats()
+            st.caption(f"Parse cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                       f"{cache_stats['memory_entries']} cached")
+            render_stats = get_render_cache().stats()
+            st.caption(f"Render cache: {render_stats['hits']} hits, {render_stats['misses']} misses, "
+                       f"{render_stats['memory_bytes'] / (1024 * 1024):.1f} MB cached")
+            
+            workspace_usage = get_workspace().usage()
+            st.caption(f"Workspace: {workspace_usage['jobs']} jobs, "
+                       f"{workspace_usage['bytes'] / (1024 * 1024):.1f} of "
+                       f"{workspace_usage['total_quota'] // (1024 * 1024)} MB on disk")
     
     # Feature highlights section
     st.markdown("""
@@ -241,23 +322,17 @@ def main():
     # Main content area
     if uploaded_file is not None:
         try:
-            # Process Excel file
-            processor = ExcelProcessor()
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
-            
-            # Process the file
+            # Process Excel file (reruns with the same upload hit the cache)
+            # View of the upload buffer, no copy of the workbook is made
+            file_buffer = uploaded_file.getbuffer()
             with st.spinner("🔄 Processing Excel file..."):
-                processed_data = processor.process_file(tmp_file_path)
+                processed_data = dict(get_parse_cache().get_or_parse(file_buffer, lambda: parse_workbook(file_buffer)))
                 # Add file size for performance tracking
                 processed_data['file_size'] = uploaded_file.size
                 st.session_state.title_data = processed_data
             
-            # Clean up temp file
-            os.unlink(tmp_file_path)
+            # Start render workers while the user reviews the summary
+            start_render_pool()
             
             # Display processing results
             st.success("✅ File processed successfully!")
@@ -282,17 +357,17 @@ def main():
             with col2:
                 st.metric("Extra Items", len(processed_data.get('extra_items', [])))
                 total_amount = processed_data.get('total_amount', 0)
-                st.metric("Total Amount", f"₹{format_currency(total_amount)}")
+                st.metric("Total Amount", format_currency(total_amount))
             
             with col3:
                 agreement_no = processed_data.get('title_info', {}).get('agreement_no', 'N/A')
                 st.metric("Agreement No.", agreement_no)
                 work_order_amount = processed_data.get('work_order_amount', 0)
-                st.metric("Work Order Amount", f"₹{format_currency(work_order_amount)}")
+                st.metric("Work Order Amount", format_currency(work_order_amount))
             
             # Generate documents button
             if st.button("🚀 Generate Documents", type="primary", use_container_width=True):
-                generate_documents(processed_data)
+                generate_documents(processed_data, prepared_formats)
             
             # Display generated files if processing is complete
             if st.session_state.processing_complete and st.session_state.generated_files:
@@ -435,13 +510,15 @@ def display_performance_summary(total_time, efficiency_score, items_count):
         st.metric("Throughput", f"{throughput:.1f} items/sec", 
                  delta=f"{'⚡' if throughput > 10 else '📊'} {'High' if throughput > 10 else 'Standard'}")
 
-def generate_documents(processed_data):
-    """Generate all document formats with performance tracking"""
+def generate_documents(processed_data, formats):
+    """Generate all documents in the given formats with performance tracking"""
     try:
         start_time = time.time()
         
-        with st.spinner("📄 Generating documents..."):
-            generator = DocumentGenerator()
+        # The session's job keeps the files for download; the lease keeps it while rendering
+        job = get_session_job()
+        with st.spinner("📄 Generating documents..."), job.lease():
+            generator = DocumentGenerator(job=job, formats=formats, render_cache=get_render_cache())
             
             # Progress bar with enhanced tracking
             progress_bar = st.progress(0)
@@ -450,53 +527,18 @@ def generate_documents(processed_data):
             # Real-time performance tracking
             performance_placeholder = st.empty()
             
-            # Generate individual documents with timing
-            documents = {}
-            total_steps = 6
-            step_times = []
+            # Render the documents concurrently, reporting each one as it completes
+            def on_document_done(doc_name, done, total):
+                title = doc_name.replace('_', ' ').title()
+                status_text.text(f"⚡ {title} ready ({done}/{total})")
+                progress_bar.progress(done / total)
             
-            # First Page
-            step_start = time.time()
-            status_text.text("⚡ Generating First Page...")
-            documents['first_page'] = generator.generate_first_page(processed_data)
-            step_times.append(time.time() - step_start)
-            progress_bar.progress(1/total_steps)
-            
-            # Deviation Statement
-            step_start = time.time()
-            status_text.text("⚡ Generating Deviation Statement...")
-            documents['deviation_statement'] = generator.generate_deviation_statement(processed_data)
-            step_times.append(time.time() - step_start)
-            progress_bar.progress(2/total_steps)
-            
-            # Note Sheet
-            step_start = time.time()
-            status_text.text("⚡ Generating Note Sheet...")
-            documents['note_sheet'] = generator.generate_note_sheet(processed_data)
-            step_times.append(time.time() - step_start)
-            progress_bar.progress(3/total_steps)
-            
-            # Extra Items (if available)
-            step_start = time.time()
-            if processed_data.get('extra_items'):
-                status_text.text("⚡ Generating Extra Items...")
-                documents['extra_items'] = generator.generate_extra_items(processed_data)
-            step_times.append(time.time() - step_start)
-            progress_bar.progress(4/total_steps)
-            
-            # Certificate
-            step_start = time.time()
-            status_text.text("⚡ Generating Certificate...")
-            documents['certificate'] = generator.generate_certificate(processed_data)
-            step_times.append(time.time() - step_start)
-            progress_bar.progress(5/total_steps)
-            
-            # Memorandum
-            step_start = time.time()
-            status_text.text("⚡ Generating Memorandum...")
-            documents['memorandum'] = generator.generate_memorandum(processed_data)
-            step_times.append(time.time() - step_start)
-            progress_bar.progress(6/total_steps)
+            # Documents the previous upload already generated are reused if their fields did not change
+            status_text.text("⚡ Generating documents...")
+            previous_files = st.session_state.generated_files
+            documents = generator.generate_all(processed_data, parallel=True, progress=on_document_done,
+                                               previous=previous_files.get('generator'))
+            step_times = [generator.render_times[doc_name] for doc_name in documents]
             
             # Generate combined documents with timing
             step_start = time.time()
@@ -504,12 +546,6 @@ def generate_documents(processed_data):
             combined_files = generator.create_combined_documents(documents, processed_data)
             step_times.append(time.time() - step_start)
             
-            # Create ZIP package with timing
-            step_start = time.time()
-            status_text.text("⚡ Creating ZIP package...")
-            zip_file = generator.create_zip_package(combined_files, processed_data)
-            step_times.append(time.time() - step_start)
-            
             # Calculate performance metrics
             total_time = time.time() - start_time
             items_count = len(processed_data.get('bill_quantity_items', []))
@@ -518,14 +554,16 @@ def generate_documents(processed_data):
             # Calculate efficiency score
             efficiency_score = calculate_efficiency_score(total_time, items_count, file_size)
             
-            # Store results with performance data
+            # Store results with performance data, releasing the previous run's files
             st.session_state.generated_files = {
                 'individual': documents,
                 'combined': combined_files,
-                'zip_file': zip_file
+                'generator': generator
             }
             st.session_state.processing_complete = True
             st.session_state.efficiency_score = efficiency_score
+            if previous_files.get('generator'):
+                previous_files['generator'].close()
             
             # Update processing history
             processing_record = {
@@ -562,40 +600,46 @@ def display_generated_files():
     """, unsafe_allow_html=True)
     
     files = st.session_state.generated_files
+    generator = files['generator']
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    # After a re-upload, say which documents were taken over unchanged
+    if generator.reused_documents:
+        reused = [doc_name.replace('_', ' ').title() for doc_name in generator.reused_documents]
+        regenerated = [doc_name.replace('_', ' ').title() for doc_name in files['individual']
+                       if doc_name not in generator.reused_documents]
+        message = f"♻️ **Reused unchanged:** {', '.join(reused)}  \n🔄 **Regenerated:** {', '.join(regenerated) or 'none'}"
+        if generator.changed_fields:
+            message += f"  \n✏️ **Changed fields:** {', '.join(generator.changed_fields)}"
+        st.info(message)
     
     # Combined documents
     st.subheader("📋 Combined Documents")
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if 'combined_pdf' in files['combined']:
-            with open(files['combined']['combined_pdf'], 'rb') as f:
-                st.download_button(
-                    label="📄 Download Combined PDF",
-                    data=f.read(),
-                    file_name=f"combined_bill_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                    mime="application/pdf"
-                )
+        display_download(generator, 'combined', 'pdf', "📄 Download Combined PDF",
+                         f"combined_bill_{timestamp}.pdf", "application/pdf")
     
     with col2:
-        if 'combined_docx' in files['combined']:
-            with open(files['combined']['combined_docx'], 'rb') as f:
-                st.download_button(
-                    label="📝 Download Combined Word",
-                    data=f.read(),
-                    file_name=f"combined_bill_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
+        display_download(generator, 'combined', 'docx', "📝 Download Combined Word",
+                         f"combined_bill_{timestamp}.docx",
+                         "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
     
     with col3:
+        # The package holds every format, so it is only built when asked for
+        if 'zip_file' not in files and st.button("📦 Prepare ZIP Package", key="prepare_zip"):
+            with st.spinner("📦 Preparing all formats..."), generator.job.lease():
+                generator.ensure_all_formats()
+                files['zip_file'] = generator.create_zip_package(generator.combined_files, generator.data,
+                                                                 documents=generator.documents)
         if 'zip_file' in files:
-            with open(files['zip_file'], 'rb') as f:
-                st.download_button(
-                    label="📦 Download ZIP Package",
-                    data=f.read(),
-                    file_name=f"bill_package_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                    mime="application/zip"
-                )
+            st.download_button(
+                label="📦 Download ZIP Package",
+                data=generator.artifacts.read(files['zip_file']),
+                file_name=f"bill_package_{timestamp}.zip",
+                mime="application/zip"
+            )
     
     # Individual documents
     st.subheader("📄 Individual Documents")
@@ -607,63 +651,65 @@ def display_generated_files():
     ])
     
     with tab1:
-        display_document_downloads("first_page", files['individual'].get('first_page', {}))
+        display_document_downloads("first_page", files['individual'].get('first_page', {}), generator)
     
     with tab2:
-        display_document_downloads("deviation_statement", files['individual'].get('deviation_statement', {}))
+        display_document_downloads("deviation_statement", files['individual'].get('deviation_statement', {}), generator)
     
     with tab3:
-        display_document_downloads("note_sheet", files['individual'].get('note_sheet', {}))
+        display_document_downloads("note_sheet", files['individual'].get('note_sheet', {}), generator)
     
     with tab4:
         if 'extra_items' in files['individual']:
-            display_document_downloads("extra_items", files['individual']['extra_items'])
+            display_document_downloads("extra_items", files['individual']['extra_items'], generator)
         else:
             st.info("No extra items found in the bill.")
     
     with tab5:
-        display_document_downloads("certificate", files['individual'].get('certificate', {}))
+        display_document_downloads("certificate", files['individual'].get('certificate', {}), generator)
     
     with tab6:
-        display_document_downloads("memorandum", files['individual'].get('memorandum', {}))
+        display_document_downloads("memorandum", files['individual'].get('memorandum', {}), generator)
 
-def display_document_downloads(doc_type, doc_files):
+def display_document_downloads(doc_type, doc_files, generator):
     """Display download buttons for a specific document type"""
     if not doc_files:
         st.info(f"No {doc_type.replace('_', ' ').title()} files generated.")
         return
     
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if 'pdf' in doc_files:
-            with open(doc_files['pdf'], 'rb') as f:
-                st.download_button(
-                    label="📄 PDF",
-                    data=f.read(),
-                    file_name=f"{doc_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                    mime="application/pdf"
-                )
+        display_download(generator, doc_type, 'pdf', "📄 PDF", f"{doc_type}_{timestamp}.pdf", "application/pdf")
     
     with col2:
-        if 'docx' in doc_files:
-            with open(doc_files['docx'], 'rb') as f:
-                st.download_button(
-                    label="📝 Word",
-                    data=f.read(),
-                    file_name=f"{doc_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
+        display_download(generator, doc_type, 'docx', "📝 Word", f"{doc_type}_{timestamp}.docx",
+                         "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
     
     with col3:
-        if 'html' in doc_files:
-            with open(doc_files['html'], 'r', encoding='utf-8') as f:
-                st.download_button(
-                    label="🌐 HTML",
-                    data=f.read(),
-                    file_name=f"{doc_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html",
-                    mime="text/html"
-                )
+        display_download(generator, doc_type, 'html', "🌐 HTML", f"{doc_type}_{timestamp}.html", "text/html")
+
+def display_download(generator, doc_name, file_format, label, file_name, mime):
+    """Download button for a generated file; a format not generated yet is prepared on request"""
+    if doc_name == 'combined':
+        name = generator.combined_files.get(f"combined_{file_format}")
+    else:
+        name = generator.documents.get(doc_name, {}).get(file_format)
+    
+    if name is None:
+        title = label.split(' ', 1)[1].removeprefix('Download ')
+        if not st.button(f"⚙️ Prepare {title}", key=f"prepare_{doc_name}_{file_format}"):
+            return
+        with st.spinner(f"Preparing {file_format.upper()}..."), generator.job.lease():
+            name = generator.ensure_format(doc_name, file_format)
+    
+    st.download_button(
+        label=label,
+        data=generator.artifacts.read(name),
+        file_name=file_name,
+        mime=mime
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+"""Generate bill packages for many workbooks from the command line
+
+Each workbook is parsed and rendered in a worker process and gets its own
+ZIP in the output directory, alongside batch_summary.csv with per-file
+timings and errors. A failing workbook is reported and the rest continue.
+
+Usage: python batch_process.py test_files/*.xlsx [-o batch_output] [-j 4]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from utils.batch_processor import BatchProcessor, find_workbooks
+from utils.workbook_reader import READER_BACKENDS
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate bill document packages for many Excel workbooks")
+    parser.add_argument('inputs', nargs='+', help="workbook files, directories or glob patterns")
+    parser.add_argument('-o', '--output', default='batch_output', help="directory for ZIP files and the summary")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument('--reader', choices=['auto'] + list(READER_BACKENDS), default=None,
+                        help="Excel reader backend (default: auto)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show per-document log messages")
+    return parser.parse_args(argv)
+
+
+def print_progress(result, done, total):
+    status = 'ok' if result['status'] == 'ok' else f"FAILED ({result['error']})"
+    seconds = result.get('total_seconds')
+    timing = f"{seconds:6.2f}s" if seconds is not None else "     -"
+    print(f"[{done}/{total}] {timing}  {os.path.basename(result['workbook'])}: {status}", flush=True)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    workbooks = find_workbooks(args.inputs)
+    if not workbooks:
+        print("No workbooks found", file=sys.stderr)
+        return 2
+
+    processor = BatchProcessor(args.output, workers=args.workers, reader=args.reader)
+    print(f"Processing {len(workbooks)} workbook(s) with {processor.workers} worker(s)")
+    start = time.perf_counter()
+    results = processor.run(workbooks, progress=print_progress)
+    wall_time = time.perf_counter() - start
+    summary_file = processor.write_summary(results)
+
+    failed = [result for result in results if result['status'] != 'ok']
+    work_time = sum(result.get('total_seconds', 0) for result in results)
+    print(f"\n{len(results) - len(failed)} succeeded, {len(failed)} failed in {wall_time:.2f}s "
+          f"({work_time:.2f}s of work). Summary: {summary_file}")
+    for result in failed:
+        print(f"  {result['workbook']}: {result['error']}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
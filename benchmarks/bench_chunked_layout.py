@@ -0,0 +1,58 @@
+"""Benchmark PDF layout of long item tables: one table vs chunked layout
+
+For each size, the first page and deviation statement of a synthetic bill
+are rendered to PDF with the whole table in one layout
+(LAYOUT_CHUNK_ROWS = 0) and in chunks of LAYOUT_CHUNK_ROWS rows. The time
+per row should stay flat for the chunked layout as the bill grows.
+
+Usage: python benchmarks/bench_chunked_layout.py [rows ...] [--chunk-rows N]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.document_generator as document_generator
+from bench_render_cache import synthetic_full_bill
+from utils.document_generator import DocumentGenerator, LANDSCAPE_DOCUMENTS
+
+DOCUMENTS = ['first_page', 'deviation_statement']
+
+
+def pdf_time(generator, doc_name: str, html_file: str, chunk_rows: int) -> float:
+    document_generator.LAYOUT_CHUNK_ROWS = chunk_rows
+    orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+    start = time.perf_counter()
+    generator._write_pdf(html_file, doc_name, orientation)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int, nargs='*', default=[500, 2000, 8000])
+    parser.add_argument('--chunk-rows', type=int, default=document_generator.LAYOUT_CHUNK_ROWS)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    document_generator.warm_up_pdf()
+
+    print(f"{'document':<20} {'rows':>6} {'one table':>22} {'chunked':>22}")
+    for rows in args.rows:
+        data = synthetic_full_bill(rows)
+        generator = DocumentGenerator(formats=())
+        generator.data = data
+        try:
+            for doc_name in DOCUMENTS:
+                html_file = generator._render_html(doc_name, data)
+                whole = pdf_time(generator, doc_name, html_file, 0)
+                chunked = pdf_time(generator, doc_name, html_file, args.chunk_rows)
+                print(f"{doc_name:<20} {rows:>6} {whole:8.2f} s {whole / rows * 1000:7.2f} ms/row "
+                      f"{chunked:8.2f} s {chunked / rows * 1000:7.2f} ms/row", flush=True)
+        finally:
+            generator.close()
+
+
+if __name__ == "__main__":
+    main()
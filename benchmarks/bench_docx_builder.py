@@ -0,0 +1,69 @@
+"""Benchmark Word generation: HTML line conversion vs DocxBuilder tables
+
+Both paths start from the same synthetic bill; the HTML path converts the
+already rendered template, as DocumentGenerator did before DocxBuilder.
+The HTML path grows quadratically (about 15 minutes at 10k items), so it
+is only timed up to HTML_PATH_MAX_ROWS.
+
+Usage: python benchmarks/bench_docx_builder.py [rows ...]
+"""
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_item_extraction import synthetic_sheet
+from utils.document_generator import DocumentGenerator
+from utils.excel_processor import ExcelProcessor
+
+DOCUMENTS = [('first_page', 'portrait'), ('deviation_statement', 'landscape')]
+
+HTML_PATH_MAX_ROWS = 10000
+
+
+def synthetic_bill(rows: int) -> dict:
+    """Processed data for a bill whose work order and bill quantities have `rows` items"""
+    processor = ExcelProcessor()
+    processor.work_order_items = processor.bill_quantity_items = processor._extract_items(synthetic_sheet(rows))
+    processor.extra_items = processor._empty_items()
+    totals = processor._calculate_totals()
+    return {
+        'title_info': {'agreement_no': '48/2024-25', 'contractor_name': 'Benchmark Contractor'},
+        'work_order_items': processor.work_order_items,
+        'bill_quantity_items': processor.bill_quantity_items,
+        'extra_items': processor.extra_items,
+        'deviation_data': processor._calculate_deviation_data(),
+        'total_amount': totals['total_amount'],
+        'work_order_amount': totals['work_order_amount'],
+    }
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 40000]
+    generator = DocumentGenerator()
+
+    for rows in sizes:
+        data = synthetic_bill(rows)
+        print(f"{rows} items", flush=True)
+        for doc_name, orientation in DOCUMENTS:
+            builder = timed(lambda: generator.docx_builder.build(doc_name, data).save(io.BytesIO()))
+            line = f"  {doc_name:<20} DocxBuilder {builder * 1000:8.1f} ms ({builder / rows * 1e6:5.1f} us/row)"
+            if rows <= HTML_PATH_MAX_ROWS:
+                html_content = generator.jinja_env.get_template(f"{doc_name}.html").render(data=data)
+                html_path = timed(lambda: generator._html_to_docx(html_content.split('\n'), io.BytesIO(), orientation))
+                line += f"   HTML lines {html_path * 1000:9.1f} ms   x{html_path / builder:6.1f}"
+            print(line, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark the formatting kernel: scalar calls vs batch APIs, across threads
+
+A column of synthetic bill amounts is formatted as currency and in words,
+once value by value with format_currency / amount_to_words and once with
+format_currencies / amounts_to_words. The batch calls are then repeated
+in several threads at once, as concurrent Streamlit sessions would, and
+every thread's output is checked against the single-threaded result.
+
+Usage: python benchmarks/bench_formatters.py [rows ...] [--threads N]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.formatters import (_paise_words, _whole_words, amount_to_words, amounts_to_words, format_currencies,
+                              format_currency)
+
+
+def synthetic_amounts(rows: int) -> np.ndarray:
+    """Item amounts in rupees and paise, from a few rupees up to tens of crores"""
+    rng = np.random.default_rng(7)
+    return np.round(10 ** rng.uniform(0, 9, rows), 2)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int, nargs='*', default=[10000, 100000])
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        amounts = synthetic_amounts(rows)
+        values = amounts.tolist()
+        print(f"{rows} amounts")
+        for name, scalar, batch in [('currency', format_currency, format_currencies),
+                                    ('words', amount_to_words, amounts_to_words)]:
+            _whole_words.cache_clear()
+            _paise_words.cache_clear()
+            expected, one_by_one = timed(lambda: [scalar(value) for value in values])
+            _whole_words.cache_clear()
+            _paise_words.cache_clear()
+            result, whole_column = timed(lambda: batch(amounts))
+            assert result == expected
+
+            with ThreadPoolExecutor(args.threads) as pool:
+                results, threaded = timed(lambda: list(pool.map(lambda _: batch(amounts), range(args.threads))))
+            consistent = all(result == expected for result in results)
+            print(f"  {name:<9} one by one {one_by_one * 1000:8.1f} ms   batch {whole_column * 1000:8.1f} ms   "
+                  f"{args.threads} threads {threaded * 1000:8.1f} ms, outputs identical: {consistent}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark regenerating a re-uploaded bill from scratch vs incrementally
+
+A synthetic bill is generated once (documents and combined files, every
+format), then edited the way a clerk would and generated again, both
+without and with the first generator passed as previous. No render cache
+is used, so reuse comes from the dependency graph alone.
+
+Usage: python benchmarks/bench_incremental.py [rows ...]
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_item_extraction import synthetic_sheet
+from utils.document_generator import DocumentGenerator
+from utils.excel_processor import ExcelProcessor
+
+
+def bill_from_sheet(sheet) -> dict:
+    """Processed data for a bill whose work order and bill quantities are sheet"""
+    processor = ExcelProcessor()
+    processor.work_order_items = processor.bill_quantity_items = processor._extract_items(sheet)
+    processor.extra_items = processor._empty_items()
+    totals = processor._calculate_totals()
+    deductions = processor._calculate_deductions(totals['total_paise'])
+    return {
+        'title_info': {'agreement_no': '48/2024-25', 'contractor_name': 'Benchmark Contractor',
+                       'work_name': 'Benchmark work'},
+        'work_order_items': processor.work_order_items,
+        'bill_quantity_items': processor.bill_quantity_items,
+        'extra_items': processor.extra_items,
+        'deviation_data': processor._calculate_deviation_data(),
+        'total_amount': totals['total_amount'],
+        'work_order_amount': totals['work_order_amount'],
+        'deductions': deductions,
+        'net_payable': processor._calculate_net_payable(totals['total_paise'], deductions),
+    }
+
+
+def generate(data, previous=None):
+    start = time.perf_counter()
+    generator = DocumentGenerator()
+    documents = generator.generate_all(data, previous=previous)
+    generator.create_combined_documents(documents, data)
+    return generator, time.perf_counter() - start
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000]
+
+    for rows in sizes:
+        sheet = synthetic_sheet(rows)
+        data = bill_from_sheet(sheet)
+        title_edit = dict(data, title_info=dict(data['title_info'], work_name='Benchmark work, revised'))
+        quantity_sheet = sheet.copy()
+        quantity_sheet.loc[1, 'Quantity'] = 123.45
+        edits = [('unchanged', bill_from_sheet(sheet)), ('work name', title_edit),
+                 ('one quantity', bill_from_sheet(quantity_sheet))]
+
+        print(f"{rows} items")
+        first, _ = generate(data)
+        for name, edited in edits:
+            scratch, full = generate(edited)
+            incremental, partial = generate(edited, previous=first)
+            print(f"  {name:<14} from scratch {full * 1000:8.1f} ms   incremental {partial * 1000:8.1f} ms   "
+                  f"reused {len(incremental.reused_documents)}/{len(incremental.documents)}: "
+                  f"{', '.join(incremental.reused_documents) or '-'}", flush=True)
+            scratch.close()
+            incremental.close()
+        first.close()
+
+
+if __name__ == "__main__":
+    main()
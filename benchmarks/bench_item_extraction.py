@@ -0,0 +1,118 @@
+"""Benchmark item extraction: row-by-row reference vs columnar ExcelProcessor path
+
+Usage: python benchmarks/bench_item_extraction.py [rows]
+"""
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.excel_processor import ExcelProcessor
+from utils.money import to_paise, to_rupees
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_files")
+ITEM_SHEETS = ['Work Order', 'Bill Quantity', 'Extra Items']
+REFERENCE_FIELDS = ('item_no', 'description', 'unit', 'quantity', 'rate', 'amount')
+
+
+def rowwise_items(df: pd.DataFrame) -> list:
+    """Reference implementation: the previous iterrows() extraction loop"""
+    def text(row, index):
+        if index < len(row) and pd.notna(row.iloc[index]):
+            return str(row.iloc[index]).strip()
+        return ""
+
+    def number(row, index):
+        try:
+            if index < len(row) and pd.notna(row.iloc[index]):
+                value = row.iloc[index]
+                if isinstance(value, (int, float)):
+                    return float(value)
+                elif isinstance(value, str):
+                    cleaned_value = value.replace(',', '').strip()
+                    if cleaned_value:
+                        return float(cleaned_value)
+        except:
+            pass
+        return 0.0
+
+    items = []
+    for index, row in df.iterrows():
+        if row.isna().all():
+            continue
+        item = {
+            'item_no': text(row, 0),
+            'description': text(row, 1),
+            'unit': text(row, 2),
+            'quantity': number(row, 3),
+            'rate': number(row, 4),
+            'amount': number(row, 5)
+        }
+        if item['amount'] == 0 and item['quantity'] > 0 and item['rate'] > 0:
+            item['amount'] = item['quantity'] * item['rate']
+        # ItemStore keeps amounts in whole paise
+        item['amount'] = float(to_rupees(to_paise(item['amount'])))
+        if item['quantity'] > 0:
+            items.append(item)
+    return items
+
+
+def synthetic_sheet(rows: int) -> pd.DataFrame:
+    """Build a Work Order-like sheet with text-polluted numeric columns"""
+    rng = np.random.default_rng(0)
+    quantity = rng.uniform(0, 500, rows).round(2).astype(object)
+    rate = rng.uniform(1, 5000, rows).round(2)
+    rate_text = np.array([f"{value:,.2f}" for value in rate], dtype=object)
+    amount = np.where(rng.random(rows) < 0.5, np.nan, rate * 3)
+    quantity[::50] = np.nan
+    return pd.DataFrame({
+        'Item No.': [f"{i // 10 + 1}.{i % 10}" for i in range(rows)],
+        'Description': [f"Item description {i}" for i in range(rows)],
+        'Unit': np.where(np.arange(rows) % 3 == 0, 'Each', 'Sqm'),
+        'Quantity': quantity,
+        'Rate': rate_text,
+        'Amount': amount,
+    })
+
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def reference_fields(items: list) -> list:
+    """Items with only the fields the reference extractor produces"""
+    return [{key: item[key] for key in REFERENCE_FIELDS} for item in items]
+
+
+def compare(label: str, frames: list):
+    processor = ExcelProcessor()
+    before = best_of(lambda: [rowwise_items(df) for df in frames])
+    after = best_of(lambda: [processor._extract_items(df) for df in frames])
+    same = all(rowwise_items(df) == reference_fields(processor._extract_items(df).to_dicts()) for df in frames)
+    print(f"{label:<32} rowwise {before * 1000:9.2f} ms   columnar {after * 1000:8.2f} ms"
+          f"   x{before / after:6.1f}   identical={same}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    for file_path in sorted(glob.glob(os.path.join(TEST_FILES, "*.xlsx"))):
+        excel_file = pd.ExcelFile(file_path)
+        frames = [excel_file.parse(sheet, header=1) for sheet in ITEM_SHEETS if sheet in excel_file.sheet_names]
+        compare(os.path.basename(file_path), frames)
+
+    compare(f"synthetic ({rows} rows)", [synthetic_sheet(rows)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark memory and math of ItemStore against lists of item dicts
+
+Retained memory is measured with tracemalloc after the source sheet is
+freed, so it counts only what the extracted items keep alive.
+
+Usage: python benchmarks/bench_item_store.py [rows]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_item_extraction import best_of, rowwise_items, synthetic_sheet
+from utils.excel_processor import ExcelProcessor
+
+
+def dict_deviation(wo_items: list, bill_items: list) -> list:
+    """Reference implementation: the previous per-item deviation loop"""
+    bill_lookup = {item.get('item_no', ''): item for item in bill_items}
+    deviation_data = []
+    for wo_item in wo_items:
+        bill_item = bill_lookup.get(wo_item.get('item_no', ''), {})
+        wo_qty = wo_item.get('quantity', 0)
+        wo_rate = wo_item.get('rate', 0)
+        exec_qty = bill_item.get('quantity', 0)
+        exec_rate = bill_item.get('rate', wo_rate)
+        excess_qty = max(0, exec_qty - wo_qty)
+        saving_qty = max(0, wo_qty - exec_qty)
+        deviation_data.append({
+            'item_no': wo_item.get('item_no', ''),
+            'description': wo_item.get('description', ''),
+            'unit': wo_item.get('unit', ''),
+            'wo_quantity': wo_qty,
+            'wo_rate': wo_rate,
+            'wo_amount': wo_qty * wo_rate,
+            'exec_quantity': exec_qty,
+            'exec_rate': exec_rate,
+            'exec_amount': exec_qty * exec_rate,
+            'excess_quantity': excess_qty,
+            'excess_amount': excess_qty * exec_rate,
+            'saving_quantity': saving_qty,
+            'saving_amount': saving_qty * exec_rate
+        })
+    return deviation_data
+
+
+def retained_bytes(build) -> int:
+    """Bytes still allocated by build()'s result once its inputs are freed"""
+    # Warm up first so lazy imports and caches are not counted
+    build()
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    processor = ExcelProcessor()
+    per_10k = 10000 / rows
+
+    def dict_items():
+        return rowwise_items(synthetic_sheet(rows))
+
+    def store_items():
+        # A fresh processor, so its string table does not hold the warm-up run's strings
+        return ExcelProcessor()._extract_items(synthetic_sheet(rows))
+
+    def dict_all():
+        items = rowwise_items(synthetic_sheet(rows))
+        return items, dict_deviation(items, items)
+
+    def store_all():
+        # A fresh processor, as above
+        store_processor = ExcelProcessor()
+        store_processor.work_order_items = store_processor._extract_items(synthetic_sheet(rows))
+        store_processor.bill_quantity_items = store_processor.work_order_items
+        return store_processor.work_order_items, store_processor._calculate_deviation_data()
+
+    print(f"{rows} items, memory per 10k items")
+    for label, before, after in [('items', dict_items, store_items),
+                                 ('items + deviation', dict_all, store_all)]:
+        before_size = retained_bytes(before) * per_10k
+        after_size = retained_bytes(after) * per_10k
+        print(f"  {label:<20} dicts {before_size / 1024 / 1024:7.2f} MB   ItemStore {after_size / 1024 / 1024:7.2f} MB"
+              f"   x{before_size / after_size:5.1f}")
+
+    items = rowwise_items(synthetic_sheet(rows))
+    processor.work_order_items = processor.bill_quantity_items = processor._extract_items(synthetic_sheet(rows))
+    processor.extra_items = processor._empty_items()
+    processor.title_data = {}
+
+    before = best_of(lambda: (sum(item['amount'] for item in items), dict_deviation(items, items)))
+    after = best_of(lambda: (processor._calculate_totals(), processor._calculate_deviation_data()))
+    print(f"  totals + deviation   dicts {before * 1000:7.2f} ms   ItemStore {after * 1000:7.2f} ms   x{before / after:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark rendering the item templates with pre-formatted number columns
+
+A synthetic bill (a tenth of its items also listed as extra items) is
+formatted once by preformat_items(), then each template is rendered once
+with every filter wrapped in a counter and timed without the counters.
+Filter calls per render and the median render time are printed per
+template, with the one-off pre-formatting time on top.
+
+Usage: python benchmarks/bench_preformat.py [rows ...] [-n repeats]
+"""
+import argparse
+import collections
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_render_cache import synthetic_full_bill
+from utils.document_generator import get_jinja_env, preformat_items
+
+TEMPLATES = ['first_page', 'deviation_statement', 'extra_items', 'note_sheet']
+
+
+def counting_env(calls: collections.Counter):
+    """A copy of the template environment whose filters count their calls"""
+    env = get_jinja_env().overlay(cache_size=0)
+
+    def counted(name, func):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    env.filters = {name: counted(name, func) for name, func in env.filters.items()}
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int, nargs='*', default=[10000])
+    parser.add_argument('-n', '--repeats', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    for rows in args.rows:
+        data = synthetic_full_bill(rows)
+        data['extra_items'] = data['bill_quantity_items'][:rows // 10]
+        start = time.perf_counter()
+        data = preformat_items(data)
+        print(f"{rows} items: pre-formatting {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        calls = collections.Counter()
+        env = counting_env(calls)
+        total_calls = total_time = 0
+        for doc_name in TEMPLATES:
+            calls.clear()
+            env.get_template(f"{doc_name}.html").render(data=data)
+            render_calls = sum(calls.values())
+            template = get_jinja_env().get_template(f"{doc_name}.html")
+            times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                template.render(data=data)
+                times.append(time.perf_counter() - start)
+            median = statistics.median(times)
+            total_calls += render_calls
+            total_time += median
+            print(f"  {doc_name:<20} {render_calls:>8} filter calls {median * 1000:8.1f} ms", flush=True)
+        print(f"  {'total':<20} {total_calls:>8} filter calls {total_time * 1000:8.1f} ms", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare ExcelProcessor reader backends on every workbook in test_files/
+
+Prints per-backend process_file time (best of N) and checks that every
+backend returns exactly the same data as the openpyxl reference.
+
+Usage: python benchmarks/bench_reader_backends.py [repeat] [extra.xlsx ...]
+"""
+import glob
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.excel_processor import ExcelProcessor
+from utils.item_store import ItemStore
+from utils.workbook_reader import READER_BACKENDS
+
+REFERENCE = 'openpyxl'
+
+
+def run(backend: str, path: str, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = ExcelProcessor(reader=backend).process_file(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, data
+
+
+def comparable(data: dict) -> dict:
+    """data with item stores as lists of dicts, which compare by value"""
+    return {key: value.to_dicts() if isinstance(value, ItemStore) else value for key, value in data.items()}
+
+
+def main():
+    logging.disable(logging.INFO)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    files = sorted(glob.glob(os.path.join(ROOT, 'test_files', '*.xlsx'))) + sys.argv[2:]
+    backends = [name for name, backend in READER_BACKENDS.items() if backend.is_available()]
+
+    print(f"{'workbook':<30}" + ''.join(f"{name:>12}" for name in backends) + "   identical")
+    totals = dict.fromkeys(backends, 0.0)
+    for path in files:
+        reference = None if REFERENCE in backends else comparable(run(backends[-1], path, 1)[1])
+        timings = {}
+        outputs = {}
+        for name in backends:
+            timings[name], data = run(name, path, repeat)
+            outputs[name] = comparable(data)
+            totals[name] += timings[name]
+        reference = outputs.get(REFERENCE, reference)
+        identical = all(output == reference for output in outputs.values())
+        print(f"{os.path.basename(path):<30}" + ''.join(f"{timings[name] * 1000:10.1f}ms" for name in backends)
+              + f"   {identical}")
+
+    print(f"{'total':<30}" + ''.join(f"{totals[name] * 1000:10.1f}ms" for name in backends))
+
+
+if __name__ == "__main__":
+    main()
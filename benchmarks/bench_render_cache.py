@@ -0,0 +1,86 @@
+"""Benchmark regenerating a bill with and without the render cache
+
+Each bill is generated in every format (documents and combined files)
+four ways: without a cache, into an empty cache, again with the same data,
+and again after only the Title sheet changed (the work name), which leaves
+the deviation statement and extra items as they were.
+
+Usage: python benchmarks/bench_render_cache.py [workbooks ...] [--rows N ...] [-n repeats]
+"""
+import argparse
+import glob
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_docx_builder import synthetic_bill
+from utils.cache import RenderCache
+from utils.document_generator import DocumentGenerator
+from utils.excel_processor import ExcelProcessor
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+
+def synthetic_full_bill(rows: int) -> dict:
+    """synthetic_bill with the deductions the note sheet and memorandum print"""
+    data = synthetic_bill(rows)
+    processor = ExcelProcessor()
+    total_paise = int(round(data['total_amount'] * 100))
+    data['deductions'] = processor._calculate_deductions(total_paise)
+    data['net_payable'] = processor._calculate_net_payable(total_paise, data['deductions'])
+    return data
+
+
+def generate(data, render_cache) -> float:
+    start = time.perf_counter()
+    generator = DocumentGenerator(render_cache=render_cache)
+    try:
+        documents = generator.generate_all(data)
+        generator.create_combined_documents(documents, data)
+    finally:
+        generator.close()
+    return time.perf_counter() - start
+
+
+def title_changed(data):
+    changed = dict(data)
+    changed['title_info'] = dict(data.get('title_info', {}), work_name='Benchmark work, revised')
+    return changed
+
+
+def measure(data, repeats: int):
+    """Median seconds without a cache, cold, repeated and after a title change"""
+    times = [[], [], [], []]
+    for _ in range(repeats):
+        times[0].append(generate(data, None))
+        cache = RenderCache()
+        times[1].append(generate(data, cache))
+        times[2].append(generate(data, cache))
+        times[3].append(generate(title_changed(data), cache))
+    return [statistics.median(values) for values in times]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('workbooks', nargs='*')
+    parser.add_argument('--rows', type=int, nargs='*', default=[])
+    parser.add_argument('-n', '--repeats', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    bills = [(os.path.basename(workbook), lambda workbook=workbook: ExcelProcessor().process_file(workbook))
+             for workbook in args.workbooks or sorted(glob.glob(os.path.join(TEST_FILES, '*.xlsx')))]
+    bills += [(f"synthetic {rows} items", lambda rows=rows: synthetic_full_bill(rows)) for rows in args.rows]
+
+    print(f"{'bill':<36} {'no cache':>10} {'cold':>10} {'repeat':>10} {'title only':>10}")
+    for name, load in bills:
+        results = measure(load(), args.repeats)
+        print(f"{name[:36]:<36} " + " ".join(f"{seconds * 1000:7.1f} ms" for seconds in results), flush=True)
+
+
+if __name__ == "__main__":
+    main()
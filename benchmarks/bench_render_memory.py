@@ -0,0 +1,74 @@
+"""Benchmark peak memory while generating a large bill
+
+Each size runs in a fresh child process: the synthetic bill is built, the
+peak RSS mark is reset (Linux /proc/self/clear_refs), and every document
+and the combined files are generated in the given formats. The peak RSS
+during generation is printed with its rise over the RSS of the loaded
+bill, and the size of the largest HTML document.
+
+Usage: python benchmarks/bench_render_memory.py [rows ...] [--formats html docx pdf]
+"""
+import argparse
+import gc
+import logging
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MB = 1024 * 1024
+
+
+def memory_status(field: str) -> int:
+    """A VmRSS/VmHWM line of /proc/self/status, in bytes"""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def measure(rows: int, formats):
+    from bench_render_cache import synthetic_full_bill
+    from utils.document_generator import DocumentGenerator, preformat_items
+
+    logging.disable(logging.INFO)
+    data = preformat_items(synthetic_full_bill(rows))
+    generator = DocumentGenerator(formats=formats)
+    gc.collect()
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+    baseline = memory_status('VmRSS')
+
+    start = time.perf_counter()
+    documents = generator.generate_all(data)
+    generator.create_combined_documents(documents, data)
+    elapsed = time.perf_counter() - start
+    peak = memory_status('VmHWM')
+    largest = max(generator.artifacts.size(files['html']) for files in documents.values())
+    generator.close()
+    print(f"{rows:>7} {peak / MB:9.1f} MB {(peak - baseline) / MB:9.1f} MB {largest / MB:9.1f} MB {elapsed:7.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int, nargs='*', default=[10000, 40000])
+    parser.add_argument('--formats', nargs='*', default=['html', 'docx', 'pdf'])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.rows[0], args.formats)
+        return
+
+    print(f"formats: {' '.join(args.formats)}")
+    print(f"{'rows':>7} {'peak RSS':>12} {'above bill':>12} {'largest HTML':>12} {'time':>9}")
+    for rows in args.rows:
+        subprocess.run([sys.executable, os.path.abspath(__file__), str(rows), '--child',
+                        '--formats', *args.formats], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark ExcelProcessor readers on a large synthetic workbook
+
+Each reader runs in a fresh subprocess so peak RSS is measured in isolation.
+
+Usage: python benchmarks/bench_workbook_reader.py [rows_per_sheet] [workbook.xlsx]
+"""
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.workbook_reader import READER_BACKENDS
+
+READERS = [name for name, backend in reversed(READER_BACKENDS.items()) if backend.is_available()]
+
+
+def sheet_rows(sheet_name: str, rows: int):
+    """Rows of a synthetic item sheet, including two header rows"""
+    yield [sheet_name]
+    yield ['Item No.', 'Description', 'Unit', 'Quantity', 'Rate', 'Amount',
+           'Remarks', 'Reference', 'Measured By', 'Checked By']
+    for i in range(rows):
+        quantity = (i % 97) + 0.5
+        rate = (i % 389) * 3.25 + 10
+        yield [f"{i // 10 + 1}.{i % 10}", f"Providing and fixing item {i} as per specification",
+               'Each' if i % 3 else 'Sqm', quantity, rate, quantity * rate,
+               f"Remark {i}", f"BSR-{i % 500}", 'AEN', 'XEN']
+
+
+def build_workbook(path: str, rows: int):
+    """Write a New Pattern workbook with wide item sheets
+
+    Uses xlsxwriter when available because, like Excel, it writes a shared
+    string table. openpyxl writes inline strings, which are much slower to
+    read back than the workbooks users actually upload.
+    """
+    title_rows = [['Agreement No.', '48/2024-25'],
+                  ['Name of Contractor', 'M/s Synthetic Builders'],
+                  ['Work Order Amount', '1,00,00,000']]
+    item_sheets = [('Work Order', rows), ('Bill Quantity', rows), ('Extra Items', rows // 20)]
+
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(path)
+        for sheet_name, values in [('Title', title_rows)] + [
+                (name, sheet_rows(name, count)) for name, count in item_sheets]:
+            sheet = workbook.add_worksheet(sheet_name)
+            for row_number, row in enumerate(values):
+                sheet.write_row(row_number, 0, row)
+        workbook.close()
+        return
+
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    title = workbook.create_sheet('Title')
+    for row in title_rows:
+        title.append(row)
+    for sheet_name, count in item_sheets:
+        sheet = workbook.create_sheet(sheet_name)
+        for row in sheet_rows(sheet_name, count):
+            sheet.append(row)
+    workbook.save(path)
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process (ru_maxrss survives exec, VmHWM does not)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(reader: str, path: str):
+    from utils.excel_processor import ExcelProcessor
+
+    start = time.perf_counter()
+    data = ExcelProcessor(reader=reader).process_file(path)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'seconds': elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'items': len(data['work_order_items']) + len(data['bill_quantity_items']) + len(data['extra_items']),
+        'total_amount': data['total_amount'],
+    }))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--baseline':
+        # Only the import's memory is measured here
+        importlib.import_module('utils.excel_processor')
+        print(peak_rss_mb())
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+        return
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.gettempdir(), f"bench_workbook_{rows}.xlsx")
+    if not os.path.exists(path):
+        print(f"Building {path} ...")
+        build_workbook(path, rows)
+    print(f"Workbook: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+    # Baseline RSS of an interpreter that has imported the processor
+    baseline = subprocess.run([sys.executable, __file__, '--baseline'],
+                              cwd=ROOT, capture_output=True, text=True, check=True)
+    print(f"Interpreter + imports: {float(baseline.stdout):.0f} MB")
+
+    for reader in READERS:
+        result = subprocess.run([sys.executable, __file__, '--child', reader, path],
+                                cwd=ROOT, capture_output=True, text=True, check=True)
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{reader:<10} {stats['seconds']:8.2f} s   peak RSS {stats['peak_rss_mb']:8.0f} MB"
+              f"   items {stats['items']}   total {stats['total_amount']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
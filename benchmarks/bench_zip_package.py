@@ -0,0 +1,84 @@
+"""Benchmark the bill package: DEFLATE everything vs format-aware compression
+
+Each workbook is rendered once, then the full package (combined files and
+every document in every format) is built both ways from the same artifacts.
+The first way deflates every entry, as create_zip_package used to; the
+second is create_zip_package, which stores PDF and DOCX entries as they are.
+
+Usage: python benchmarks/bench_zip_package.py [workbooks ...] [-n repeats]
+"""
+import argparse
+import glob
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_generator import DocumentGenerator
+from utils.excel_processor import ExcelProcessor
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+
+def deflate_all(generator, entries) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for arcname, name in entries:
+            zipf.writestr(arcname, generator.artifacts.read(name))
+    return buffer.getvalue()
+
+
+def format_aware(generator, combined_files, data, documents) -> bytes:
+    buffer = io.BytesIO()
+    generator.create_zip_package(combined_files, data, target=buffer, documents=documents)
+    return buffer.getvalue()
+
+
+def median_time(func, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('workbooks', nargs='*')
+    parser.add_argument('-n', '--repeats', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    workbooks = args.workbooks or sorted(glob.glob(os.path.join(TEST_FILES, '*.xlsx')))
+    totals = [0.0, 0, 0.0, 0]
+    print(f"{'workbook':<36} {'deflate all':>22} {'format-aware':>22}")
+    for workbook in workbooks:
+        data = ExcelProcessor().process_file(workbook)
+        generator = DocumentGenerator()
+        try:
+            documents = generator.generate_all(data)
+            combined_files = generator.create_combined_documents(documents, data)
+            entries = generator._package_entries(combined_files, documents)
+
+            old_time, old_zip = median_time(lambda: deflate_all(generator, entries), args.repeats)
+            new_time, new_zip = median_time(
+                lambda: format_aware(generator, combined_files, data, documents), args.repeats)
+        finally:
+            generator.close()
+
+        totals = [totals[0] + old_time, totals[1] + len(old_zip), totals[2] + new_time, totals[3] + len(new_zip)]
+        print(f"{os.path.basename(workbook)[:36]:<36} {old_time * 1000:8.1f} ms {len(old_zip) / 1024:8.1f} kB "
+              f"{new_time * 1000:8.1f} ms {len(new_zip) / 1024:8.1f} kB", flush=True)
+
+    print(f"{'total':<36} {totals[0] * 1000:8.1f} ms {totals[1] / 1024:8.1f} kB "
+          f"{totals[2] * 1000:8.1f} ms {totals[3] / 1024:8.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
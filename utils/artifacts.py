@@ -0,0 +1,257 @@
+import io
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Union
+
+from utils.buffers import MemoryReader
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Artifacts larger than this are moved from memory to a file in the spill directory
+ARTIFACT_SPILL_BYTES = int(os.environ.get('ARTIFACT_SPILL_BYTES', 16 * 1024 * 1024))
+
+# Block size used when streaming an artifact into another file
+COPY_CHUNK_BYTES = 1024 * 1024
+
+class SpillFile(io.BufferedIOBase):
+    """Binary file in memory that moves to an anonymous temporary file once it grows past max_size
+
+    Like tempfile.SpooledTemporaryFile, except that where the content lives
+    is public: ``spilled`` tells whether it is on disk, and getvalue()
+    returns the in-memory content without copying it. A max_size of 0
+    keeps the file in memory.
+    """
+
+    def __init__(self, max_size: int, dir: Optional[str] = None):
+        super().__init__()
+        self.max_size = max_size
+        self.dir = dir
+        self.spilled = False
+        self._file = io.BytesIO()
+
+    def rollover(self):
+        """Move the content to a temporary file, keeping the position"""
+        if self.spilled:
+            return
+        memory = self._file
+        self._file = tempfile.TemporaryFile(dir=self.dir)
+        with memory.getbuffer() as buffer:
+            self._file.write(buffer)
+        self._file.seek(memory.tell())
+        memory.close()
+        self.spilled = True
+
+    def getvalue(self) -> bytes:
+        """Content of a file still in memory"""
+        if self.spilled:
+            raise io.UnsupportedOperation("getvalue() of a spilled file")
+        return self._file.getvalue()
+
+    def write(self, data) -> int:
+        written = self._file.write(data)
+        if self.max_size and not self.spilled and self._file.tell() > self.max_size:
+            self.rollover()
+        return written
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._file.read(size)
+
+    def read1(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self._file.truncate(size)
+
+    def flush(self):
+        if not self.closed:
+            self._file.flush()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        # The base close() flushes, so the underlying file goes last
+        super().close()
+        self._file.close()
+
+class ArtifactStore:
+    """Thread-safe set of named binary files kept in memory
+
+    Each artifact is a SpillFile: it stays in memory until it grows past
+    ``spill_bytes`` and then continues as an anonymous file in ``spill_dir``
+    (the system temp directory when None). Renderers write into
+    artifacts and combiners, the ZIP package and downloads read them back, so
+    small bills never touch the disk. ``track_disk(delta)`` is told about
+    bytes spilled and freed, and may raise to refuse a spilled artifact.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None, spill_bytes: Optional[int] = None,
+                 track_disk: Optional[Callable[[int], None]] = None):
+        self.spill_dir = spill_dir
+        self.spill_bytes = ARTIFACT_SPILL_BYTES if spill_bytes is None else spill_bytes
+        self.track_disk = track_disk
+        self._files = {}
+        self._spilled = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def create(self, name: str) -> Iterator[BinaryIO]:
+        """Writable file for a new artifact, published under name once the block succeeds
+
+        An artifact already stored under name is replaced. If the block
+        raises, or track_disk refuses the spilled file, the partial artifact
+        is discarded.
+        """
+        file = SpillFile(self.spill_bytes, self.spill_dir)
+        try:
+            yield file
+            spilled = file.seek(0, os.SEEK_END) if file.spilled else 0
+            if spilled and self.track_disk:
+                self.track_disk(spilled)
+        except BaseException:
+            file.close()
+            raise
+        with self._lock:
+            previous = self._pop(name)
+            self._files[name] = file
+            self._spilled[name] = spilled
+        self._close(previous)
+
+    def write(self, name: str, content: Union[bytes, str]) -> str:
+        """Store content under name, text as UTF-8, and return the name"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        with self.create(name) as file:
+            file.write(content)
+        return name
+
+    def read(self, name: str) -> bytes:
+        """Whole content of an artifact"""
+        with self._lock:
+            file = self._files[name]
+            file.seek(0)
+            return file.read()
+
+    def read_text(self, name: str) -> str:
+        """Content of a text artifact"""
+        return self.read(name).decode('utf-8')
+
+    @contextmanager
+    def view(self, name: str) -> Iterator[Union[bytes, mmap.mmap]]:
+        """The content of an artifact without copying it: bytes in memory, a read-only map of a spill file
+
+        Both support len(), slicing, find() and regular expressions. The
+        artifact may be replaced or discarded meanwhile; the view stays valid.
+        """
+        with self._lock:
+            file = self._files[name]
+            if file.spilled:
+                file.flush()
+                content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                # Shares the file's buffer, which no longer changes once published
+                content = file.getvalue()
+        try:
+            yield content
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+
+    @contextmanager
+    def reader(self, name: str) -> Iterator[BinaryIO]:
+        """Read-only binary file over view(name), with its own position"""
+        with self.view(name) as content:
+            if isinstance(content, bytes):
+                yield io.BytesIO(content)
+            else:
+                reader = io.BufferedReader(MemoryReader(content), COPY_CHUNK_BYTES)
+                try:
+                    yield reader
+                finally:
+                    reader.close()
+
+    def copy_to(self, name: str, target: BinaryIO):
+        """Stream an artifact into an open file without holding it in memory twice"""
+        with self._lock:
+            file = self._files[name]
+            file.seek(0)
+            shutil.copyfileobj(file, target, COPY_CHUNK_BYTES)
+
+    def size(self, name: str) -> int:
+        """Size of an artifact in bytes"""
+        with self._lock:
+            file = self._files[name]
+            file.seek(0, os.SEEK_END)
+            return file.tell()
+
+    def names(self) -> List[str]:
+        """Names of all stored artifacts"""
+        with self._lock:
+            return list(self._files)
+
+    def stats(self) -> Dict[str, int]:
+        """Artifact count and bytes held in memory and spilled to disk"""
+        stats = {'artifacts': 0, 'memory_bytes': 0, 'spilled_bytes': 0}
+        with self._lock:
+            for name, file in self._files.items():
+                stats['artifacts'] += 1
+                tier = 'spilled_bytes' if file.spilled else 'memory_bytes'
+                stats[tier] += self.size(name)
+        return stats
+
+    def discard(self, name: str):
+        """Remove an artifact and free its memory or spill file"""
+        with self._lock:
+            removed = self._pop(name)
+        self._close(removed)
+
+    def close(self):
+        """Remove every artifact"""
+        with self._lock:
+            removed = [self._pop(name) for name in list(self._files)]
+        for entry in removed:
+            self._close(entry)
+
+    def _pop(self, name: str):
+        # (file, spilled bytes) of an artifact, taken out of the store
+        if name not in self._files:
+            return None
+        return self._files.pop(name), self._spilled.pop(name)
+
+    def _close(self, entry):
+        if entry is None:
+            return
+        file, spilled = entry
+        file.close()
+        if spilled and self.track_disk:
+            self.track_disk(-spilled)
+
+    def __contains__(self, name: object) -> bool:
+        with self._lock:
+            return name in self._files
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._files)
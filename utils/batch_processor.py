@@ -0,0 +1,154 @@
+import csv
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.document_generator import DocumentGenerator, warm_up_renderer
+from utils.excel_processor import ExcelProcessor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Columns of the batch summary report
+SUMMARY_FIELDS = [
+    'workbook', 'status', 'zip_file', 'items', 'total_amount', 'net_payable',
+    'parse_seconds', 'documents_seconds', 'package_seconds', 'total_seconds', 'error'
+]
+
+
+def find_workbooks(inputs: Iterable[str]) -> List[str]:
+    """Expand files, directories and glob patterns into a sorted list of workbooks"""
+    workbooks = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern) or [pattern]
+
+        for path in matches:
+            name = os.path.basename(path)
+            # Skip Excel lock files such as "~$bill.xlsx"
+            if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith('~$'):
+                workbooks.add(os.path.abspath(path))
+
+    return sorted(workbooks)
+
+
+def process_workbook(workbook: str, zip_path: str, reader: Optional[str] = None) -> Dict[str, Any]:
+    """Parse one workbook and write its document package to zip_path
+
+    Runs in a worker process. Errors are returned in the result instead of
+    raised, so one bad workbook never stops the batch.
+    """
+    result = {'workbook': workbook, 'status': 'failed', 'zip_file': '', 'error': ''}
+    start = time.perf_counter()
+    generator = None
+
+    try:
+        data = ExcelProcessor(reader=reader).process_file(workbook)
+        result['items'] = len(data['bill_quantity_items']) + len(data['extra_items'])
+        result['total_amount'] = data['total_amount']
+        result['net_payable'] = data['net_payable']
+        parsed = time.perf_counter()
+        result['parse_seconds'] = parsed - start
+
+        generator = DocumentGenerator()
+        # Hold the job's files until the package is written
+        with generator.job.lease():
+            documents = generator.generate_all(data)
+            rendered = time.perf_counter()
+            result['documents_seconds'] = rendered - parsed
+
+            combined_files = generator.create_combined_documents(documents, data)
+            generator.create_zip_package(combined_files, data, target=zip_path, documents=documents)
+            result['package_seconds'] = time.perf_counter() - rendered
+
+        result['zip_file'] = zip_path
+        result['status'] = 'ok'
+
+    except Exception as e:
+        logger.error(f"Error processing {workbook}: {str(e)}")
+        result['error'] = f"{type(e).__name__}: {str(e)}"
+
+    finally:
+        # Each generator owns a workspace job; delete its files right away
+        if generator is not None:
+            generator.close()
+
+    result['total_seconds'] = time.perf_counter() - start
+    return result
+
+
+class BatchProcessor:
+    """Generates bill packages for many workbooks in a pool of worker processes"""
+
+    def __init__(self, output_dir: str, workers: Optional[int] = None, reader: Optional[str] = None):
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.reader = reader
+
+    def run(self, workbooks: List[str],
+            progress: Optional[Callable[[Dict[str, Any], int, int], None]] = None) -> List[Dict[str, Any]]:
+        """Process workbooks and return one result per workbook, in input order
+
+        progress(result, done, total) is called as each workbook finishes.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        zip_paths = self._zip_paths(workbooks)
+        results = {}
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up_renderer) as executor:
+            futures = {
+                executor.submit(process_workbook, workbook, zip_paths[workbook], self.reader): workbook
+                for workbook in workbooks
+            }
+            for future in as_completed(futures):
+                workbook = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. killed for memory)
+                    logger.error(f"Worker failed on {workbook}: {str(e)}")
+                    result = {'workbook': workbook, 'status': 'failed', 'zip_file': '',
+                              'error': f"{type(e).__name__}: {str(e)}"}
+                results[workbook] = result
+                if progress:
+                    progress(result, len(results), len(workbooks))
+
+        return [results[workbook] for workbook in workbooks]
+
+    def write_summary(self, results: List[Dict[str, Any]]) -> str:
+        """Write the per-workbook report as CSV and return its path"""
+        summary_file = os.path.join(self.output_dir, 'batch_summary.csv')
+        with open(summary_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for result in results:
+                writer.writerow({field: self._format_field(result.get(field, '')) for field in SUMMARY_FIELDS})
+        return summary_file
+
+    def _zip_paths(self, workbooks: List[str]) -> Dict[str, str]:
+        """One ZIP per workbook named after it, numbered if names collide"""
+        zip_paths = {}
+        used = set()
+        for workbook in workbooks:
+            stem = os.path.splitext(os.path.basename(workbook))[0]
+            name = f"{stem}.zip"
+            counter = 2
+            while name in used:
+                name = f"{stem}_{counter}.zip"
+                counter += 1
+            used.add(name)
+            zip_paths[workbook] = os.path.join(self.output_dir, name)
+        return zip_paths
+
+    def _format_field(self, value: Any) -> Any:
+        if isinstance(value, float):
+            return f"{value:.3f}" if abs(value) < 1000 else f"{value:.2f}"
+        return value
@@ -0,0 +1,44 @@
+import io
+from typing import Union
+
+# Anything exposing a contiguous byte buffer: bytes, bytearray, memoryview, mmap
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class MemoryReader(io.RawIOBase):
+    """Seekable read-only file over a buffer, without copying it
+
+    Wrap it in io.BufferedReader for line and small reads. Closing the
+    reader releases its view, so an mmap behind it can be closed after.
+    """
+
+    def __init__(self, buffer: Buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = min(len(target), len(self._view) - self._position)
+        target[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        super().close()
+        self._view.release()
@@ -0,0 +1,280 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+import numpy as np
+
+from utils.excel_processor import PROCESSOR_VERSION
+from utils.item_store import ItemStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TieredCache:
+    """Thread-safe LRU cache with an in-memory tier and an optional disk tier
+
+    The memory tier holds up to ``max_entries`` values. When ``disk_dir`` is
+    set, values are also pickled there and the least recently used files are
+    deleted once the directory grows past ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_entries: int = 32, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['hits'] += 1
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['hits'] += 1
+            self._counters['disk_hits'] += 1
+            self._store_memory(key, value)
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store value under key in every tier"""
+        with self._lock:
+            self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+        stats['disk_bytes'] = self._disk_usage()
+        return stats
+
+    def clear(self):
+        """Drop every cached value (counters are kept)"""
+        with self._lock:
+            self._memory.clear()
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith('.pkl'):
+                    self._remove(os.path.join(self.disk_dir, name))
+
+    def _store_memory(self, key: str, value: Any):
+        """Insert into the memory tier, evicting the least recently used (lock held)"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['memory_evictions'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        """Load a value from the disk tier and mark it as recently used"""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading cache entry {key}: {str(e)}")
+            self._remove(path)
+            return None
+
+    def _write_disk(self, key: str, value: Any):
+        """Pickle a value into the disk tier, then enforce the size limit"""
+        if not self.disk_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logger.error(f"Error writing cache entry {key}: {str(e)}")
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until the tier fits max_disk_bytes"""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+            with self._lock:
+                self._counters['disk_evictions'] += 1
+
+    def _disk_usage(self) -> int:
+        if not self.disk_dir:
+            return 0
+        total = 0
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.pkl'):
+                try:
+                    total += os.path.getsize(os.path.join(self.disk_dir, name))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ParseCache(TieredCache):
+    """Cache of ExcelProcessor results keyed by the uploaded workbook bytes
+
+    The key combines a SHA-256 of the file contents with the processor
+    version, so re-uploading the same bill costs a hash instead of a parse,
+    and a new processor release never serves stale results.
+    """
+
+    def key_for(self, data: Union[bytes, memoryview]) -> str:
+        """Cache key for workbook contents"""
+        return f"{hashlib.sha256(data).hexdigest()}-v{PROCESSOR_VERSION}"
+
+    def get_or_parse(self, data: Union[bytes, memoryview], parse: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return parsed data for workbook bytes, calling parse() on a miss"""
+        return self.get_or_compute(self.key_for(data), parse)
+
+
+class RenderCache(TieredCache):
+    """Cache of rendered HTML, PDF and DOCX bytes
+
+    Keys combine a hash of the template source with a fingerprint of the
+    part of the bill the document reads (see render_key), so a bill whose
+    other sheets changed still hits. Besides ``max_entries``, the memory
+    tier is bounded by ``max_memory_bytes``; larger outputs are kept on
+    disk only.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024, max_memory_bytes: int = 128 * 1024 * 1024):
+        super().__init__(max_entries, disk_dir, max_disk_bytes)
+        self.max_memory_bytes = max_memory_bytes
+        self._memory_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current tier sizes"""
+        stats = super().stats()
+        with self._lock:
+            stats['memory_bytes'] = self._memory_bytes
+        return stats
+
+    def clear(self):
+        """Drop every cached value (counters are kept)"""
+        super().clear()
+        with self._lock:
+            self._memory_bytes = 0
+
+    def _store_memory(self, key: str, value: bytes):
+        """Insert into the memory tier, evicting the least recently used (lock held)"""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while self._memory and (len(self._memory) > self.max_entries
+                                or self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters['memory_evictions'] += 1
+
+
+def render_key(*parts: str) -> str:
+    """Cache key for an output identified by parts (source hash, data fingerprint, format, ...)"""
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+def data_fingerprint(data: Dict[str, Any], fields: Iterable[str]) -> str:
+    """SHA-256 of the values of fields ('field' or 'field.key') in data
+
+    Only these values affect the result, so a change elsewhere in the
+    bill leaves the fingerprint as it was. The field '' stands for the
+    whole of data, as template_info() gives it for templates that use data
+    as a whole.
+    """
+    digest = hashlib.sha256()
+    for field in sorted(set(fields)):
+        value = data
+        for key in field.split('.') if field else ():
+            value = value.get(key) if isinstance(value, dict) else None
+        digest.update(field.encode('utf-8') + b'\0')
+        _update_fingerprint(digest, value)
+    return digest.hexdigest()
+
+
+def _update_fingerprint(digest, value: Any):
+    """Feed a value built from dicts, sequences, arrays, item stores and scalars into digest"""
+    if isinstance(value, ItemStore):
+        digest.update(b'S' + value.fingerprint().encode('ascii'))
+    elif isinstance(value, dict):
+        digest.update(b'D%d' % len(value))
+        for key in sorted(value, key=str):
+            _update_fingerprint(digest, str(key))
+            _update_fingerprint(digest, value[key])
+    elif isinstance(value, (list, tuple)) or (isinstance(value, np.ndarray) and value.dtype == object):
+        digest.update(b'L%d' % len(value))
+        for item in value:
+            _update_fingerprint(digest, item)
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update(f"A{value.dtype.str}{value.shape}".encode('ascii'))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        text = repr(value).encode('utf-8', 'surrogatepass')
+        digest.update(b'V%d:' % len(text) + text)
@@ -1,54 +1,556 @@
+import hashlib
+import io
+import multiprocessing
 import os
-import tempfile
+import re
+import threading
+import time
 import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Any, NamedTuple, Optional, Tuple, Union
 import weasyprint
-from docx import Document
-from docx.shared import Inches, Mm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.section import WD_ORIENT
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, nodes, select_autoescape
 import logging
 
+from utils.artifacts import ArtifactStore
+from utils.cache import RenderCache, data_fingerprint, render_key
+from utils.docx_builder import DocxBuilder, merge_documents, new_document
+from utils.formatters import amount_to_words, format_currency, format_numbers, number_to_words
+from utils.item_store import ItemStore
+from utils.workspace import Job, get_workspace
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class DocumentGenerator:
-    """Generates documents in multiple formats from processed data"""
+# Order of the documents in a bill package
+DOCUMENT_ORDER = ['first_page', 'deviation_statement', 'note_sheet', 'extra_items', 'certificate', 'memorandum']
+
+# Documents laid out on landscape pages
+LANDSCAPE_DOCUMENTS = {'deviation_statement'}
+
+# Bump whenever the filters, page styles or Word layouts change output; part of the RenderCache key
+RENDER_VERSION = 4
+
+class ChunkedTable(NamedTuple):
+    """The item rows of a document that may be laid out in chunks, and the columns totalled across chunks"""
+    field: str
+    totals: Tuple[str, ...]
+
+# Documents whose item table is laid out in chunks for PDF once it is long
+CHUNKED_DOCUMENTS = {
+    'first_page': ChunkedTable('bill_quantity_items', ('amount',)),
+    'deviation_statement': ChunkedTable('deviation_data', (
+        'wo_quantity', 'wo_amount', 'exec_quantity', 'exec_amount',
+        'excess_quantity', 'excess_amount', 'saving_quantity', 'saving_amount'
+    ))
+}
+
+# Rows per chunk, a few full pages (env LAYOUT_CHUNK_ROWS overrides, 0 lays out every table whole)
+LAYOUT_CHUNK_ROWS = int(os.environ.get('LAYOUT_CHUNK_ROWS', 250))
+
+# Template output pieces joined per write when streaming a document into its HTML artifact
+RENDER_BUFFER_PIECES = 64
+
+class LayoutChunk(NamedTuple):
+    """One chunk of a chunked table, passed to the template as ``chunk``
+    
+    Each chunk is laid out as a document of its own: the first opens with
+    the heading, the others with the running totals brought forward (B/F);
+    all but the last end with the totals carried forward (C/F).
+    """
+    index: int
+    count: int
+    brought_forward: Dict[str, float]
+    carried_forward: Dict[str, float]
+    
+    @property
+    def first(self) -> bool:
+        return self.index == 0
+    
+    @property
+    def last(self) -> bool:
+        return self.index == self.count - 1
+
+def layout_chunks(rows: Any, totals: Iterable[str], chunk_rows: int) -> List[Tuple[slice, LayoutChunk]]:
+    """Split rows (an ItemStore or a list of dicts) into chunks with running totals of the totals columns
+    
+    Values are added in row order, as the templates' sum filter does, so
+    the last chunk carries forward exactly the unchunked grand totals.
+    """
+    count = -(-len(rows) // chunk_rows)
+    running = dict.fromkeys(totals, 0)
+    chunks = []
+    for index in range(count):
+        bounds = slice(index * chunk_rows, min(len(rows), (index + 1) * chunk_rows))
+        brought_forward = dict(running)
+        for field in running:
+            if isinstance(rows, ItemStore):
+                values = rows.column(field)[bounds].tolist() if field in rows.fields else []
+            else:
+                values = [item.get(field, 0) for item in rows[bounds]]
+            running[field] = sum(values, running[field])
+        chunks.append((bounds, LayoutChunk(index, count, brought_forward, dict(running))))
+    return chunks
+
+def preformat_items(data: Dict[str, Any]) -> Dict[str, Any]:
+    """data with every item store replaced by its pre-formatted version (see ItemStore.formatted)
+    
+    Number columns are formatted once per bill, and the templates and Word
+    tables print the '<field>_fmt' strings instead of calling format_number
+    per cell. Items given as a list of dicts are put in a store first.
+    Returns data itself when its stores are already formatted.
+    """
+    formatted = {}
+    for key, value in data.items():
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            value = ItemStore.from_dicts(value, list(dict.fromkeys(field for item in value for field in item)))
+        if isinstance(value, ItemStore):
+            value = value.formatted()
+            if value is not data[key]:
+                formatted[key] = value
+    return dict(data, **formatted) if formatted else data
+
+def item_rows(items: Any, *fields: str) -> Iterable[Any]:
+    """Template filter: an item store's rows with only the given fields, read for this render
+    
+    See ItemStore.rows; the per-field lists are dropped when the loop ends,
+    so nothing is added to a store shared between sessions. Other item
+    lists are iterated as they are.
+    """
+    if isinstance(items, ItemStore):
+        return items.rows(*fields)
+    return items
+
+# 'combined' lays out all documents as one WeasyPrint document and slices the
+# individual PDFs from it; 'separate' renders each PDF on its own and merges
+PDF_MODES = ('combined', 'separate')
+PDF_MODE_ENV_VAR = 'PDF_MODE'
+
+# Formats every document can be produced in, and the folders of a bill package.
+# HTML is always rendered, it is the source of the other formats.
+OUTPUT_FORMATS = ('pdf', 'docx', 'html')
+
+# Files that are already compressed are stored as they are; deflating them again
+# costs CPU for a gain of a few percent
+STORED_EXTENSIONS = {'.pdf', '.docx', '.zip', '.png', '.jpg', '.jpeg'}
+
+# Other entries are stored too when a deflated sample shrinks by less than this ratio
+ZIP_SAMPLE_BYTES = 64 * 1024
+ZIP_MIN_SAVING = 0.1
+
+# Text up to this size is deflated at the highest level, larger text at the default
+# level, which is about five times faster for a few percent larger output
+ZIP_SMALL_ENTRY_BYTES = 1024 * 1024
+
+# Entries are read and classified this many at a time, then written in order
+ZIP_PREPARE_WORKERS = 4
+
+# Page setup and base font applied to every PDF. Passed as user stylesheets,
+# so the templates' own body rules still take precedence.
+PDF_PAGE_CSS = """
+@page {{
+    size: A4 {orientation};
+    margin: 10mm;
+}}
+@page landscape {{
+    size: A4 landscape;
+}}
+{body} {{
+    font-family: Arial, sans-serif;
+    font-size: 12px;
+    line-height: 1.4;
+}}
+"""
+
+# Combined layout: each document is a section starting on a new page
+COMBINED_PDF_CSS = PDF_PAGE_CSS.format(orientation='portrait', body='.doc-section') + f"""
+{', '.join(f'.doc-{doc_name}' for doc_name in sorted(LANDSCAPE_DOCUMENTS))} {{
+    page: landscape;
+}}
+.doc-section + .doc-section {{
+    break-before: page;
+}}
+"""
+
+class PdfResources:
+    """WeasyPrint state reused by the PDF renders of the process
+    
+    Holds one font configuration (system fonts are discovered once), the
+    page stylesheets parsed once per layout and an image cache. WeasyPrint
+    objects are not safe to share between threads, so an instance serves one
+    render at a time; pdf_resources() hands them out.
+    """
     
     def __init__(self):
-        # Get the correct template directory path
-        import os
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        self.template_dir = os.path.join(project_root, "templates")
-        self.temp_dir = tempfile.mkdtemp()
-        
-        # Initialize Jinja2 environment
-        self.jinja_env = Environment(
-            loader=FileSystemLoader(self.template_dir),
-            autoescape=select_autoescape(['html', 'xml'])
+        from weasyprint.text.fonts import FontConfiguration
+        self.font_config = FontConfiguration()
+        self.image_cache = {}
+        self.stylesheets = {
+            layout: weasyprint.CSS(string=css, font_config=self.font_config)
+            for layout, css in [
+                ('portrait', PDF_PAGE_CSS.format(orientation='portrait', body='body')),
+                ('landscape', PDF_PAGE_CSS.format(orientation='landscape', body='body')),
+                ('combined', COMBINED_PDF_CSS),
+            ]
+        }
+    
+    def render(self, html: Union[str, BinaryIO], layout: str):
+        """Lay out an HTML string or UTF-8 file with this instance's state"""
+        if isinstance(html, str):
+            source = weasyprint.HTML(string=html)
+        else:
+            source = weasyprint.HTML(file_obj=html, encoding='utf-8')
+        return source.render(
+            font_config=self.font_config,
+            stylesheets=[self.stylesheets[layout]],
+            cache=self.image_cache
         )
+
+# PdfResources not in use by a render, see pdf_resources()
+_idle_pdf_resources = []
+_pdf_resources_lock = threading.Lock()
+
+@contextmanager
+def pdf_resources() -> Iterator[PdfResources]:
+    """PdfResources for one render: an idle instance, or a new one when all are in use
+    
+    Concurrent renders, such as two sessions' bills, each get an instance
+    instead of waiting for one another. Instances are returned afterwards
+    and reused by any thread, so fonts and stylesheets are loaded once per
+    concurrent render rather than once per bill.
+    """
+    with _pdf_resources_lock:
+        resources = _idle_pdf_resources.pop() if _idle_pdf_resources else None
+    if resources is None:
+        resources = PdfResources()
+    try:
+        yield resources
+    finally:
+        with _pdf_resources_lock:
+            _idle_pdf_resources.append(resources)
+
+def warm_up_pdf():
+    """Load fonts and page styles now so the first PDF after a restart does not wait for them"""
+    try:
+        start = time.perf_counter()
+        with pdf_resources() as resources:
+            for layout in resources.stylesheets:
+                resources.render('<p>Warm-up 0123456789 ₹</p>', layout).write_pdf()
+        logger.info(f"PDF renderer warmed up in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.error(f"Error warming up PDF renderer: {str(e)}")
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+# Compiled templates are kept here across processes and restarts (env
+# TEMPLATE_CACHE_DIR overrides, default a per-user directory under /tmp)
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+
+# Development mode: re-check template file mtimes on every render
+TEMPLATE_AUTO_RELOAD = os.environ.get('TEMPLATE_AUTO_RELOAD', '').lower() in ('1', 'true', 'yes')
+
+# Jinja2 environment shared by every DocumentGenerator in the process
+_jinja_env = None
+_jinja_env_lock = threading.Lock()
+
+def get_jinja_env() -> Environment:
+    """The process-wide template environment, created on first use
+    
+    Compiled templates stay in memory, and their bytecode is cached on disk
+    so other processes load it instead of compiling the templates again.
+    Unless TEMPLATE_AUTO_RELOAD is set, templates loaded once are not
+    re-checked for changes.
+    """
+    global _jinja_env
+    with _jinja_env_lock:
+        if _jinja_env is None:
+            if TEMPLATE_CACHE_DIR:
+                os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+            env = Environment(
+                loader=FileSystemLoader(TEMPLATE_DIR),
+                autoescape=select_autoescape(['html', 'xml']),
+                bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+                auto_reload=TEMPLATE_AUTO_RELOAD
+            )
+            
+            # Add custom filters
+            env.filters['format_number'] = DocumentGenerator._format_number
+            env.filters['format_currency'] = DocumentGenerator._format_currency
+            env.filters['format_date'] = DocumentGenerator._format_date
+            env.filters['number_to_words'] = number_to_words
+            env.filters['amount_to_words'] = amount_to_words
+            env.filters['item_rows'] = item_rows
+            _jinja_env = env
+        return _jinja_env
+
+def precompile_templates() -> int:
+    """Load every template now so the first bill does not compile any; returns the count"""
+    env = get_jinja_env()
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+# Attributes of a field that are method calls rather than keys, as in data.title_info.get('x')
+MAPPING_METHODS = {'get', 'items', 'keys', 'values'}
+
+# Source hash and data fields of each template, see template_info()
+_template_info = {}
+_template_info_lock = threading.Lock()
+
+def template_info(name: str) -> Tuple[str, Tuple[str, ...]]:
+    """SHA-256 of a template's source and the fields of the bill data it reads
+    
+    Fields are found in the template's syntax tree: each data.field.key,
+    data.field or data['field'] lookup gives 'field.key' or 'field'. A
+    template that uses data in any other way reads all of it, given as the
+    single field ''. Like compiled templates, the result is only refreshed
+    when TEMPLATE_AUTO_RELOAD is set.
+    """
+    with _template_info_lock:
+        info = _template_info.get(name)
+        if info is not None and (not TEMPLATE_AUTO_RELOAD or info[2]()):
+            return info[0], info[1]
+    
+    env = get_jinja_env()
+    source, _, uptodate = env.loader.get_source(env, name)
+    fields = set()
+    _collect_data_fields(env.parse(source), fields)
+    if '' in fields:
+        fields = {''}
+    info = (hashlib.sha256(source.encode('utf-8')).hexdigest(), tuple(sorted(fields)), uptodate)
+    with _template_info_lock:
+        _template_info[name] = info
+    return info[0], info[1]
+
+def _collect_data_fields(node: nodes.Node, fields: set):
+    """Add the fields of data read under node, at most two levels deep"""
+    keys = []
+    lookup = node
+    while isinstance(lookup, (nodes.Getattr, nodes.Getitem)):
+        if isinstance(lookup, nodes.Getattr):
+            keys.append(lookup.attr)
+        elif isinstance(lookup.arg, nodes.Const) and isinstance(lookup.arg.value, str):
+            keys.append(lookup.arg.value)
+        else:
+            # A computed key: the lookup reads all of the value it is applied to
+            _collect_data_fields(lookup.arg, fields)
+            keys = []
+        lookup = lookup.node
+    
+    if isinstance(lookup, nodes.Name) and lookup.name == 'data':
+        path = []
+        for key in reversed(keys[-2:]):
+            if key in MAPPING_METHODS:
+                break
+            path.append(key)
+        fields.add('.'.join(path))
+        return
+    for child in node.iter_child_nodes():
+        _collect_data_fields(child, fields)
+
+def document_fields(doc_name: str) -> Tuple[str, ...]:
+    """Fields of the bill data a document reads in any of its formats"""
+    _, fields = template_info(f"{doc_name}.html")
+    return tuple(sorted(set(fields) | set(DocxBuilder.FIELDS.get(doc_name, ()))))
+
+def dependency_graph() -> Dict[str, Tuple[str, ...]]:
+    """Fields each document of DOCUMENT_ORDER reads; every combined file depends on all documents
+    
+    For example the certificate reads title_info fields and total_amount,
+    the deviation statement deviation_data and the two amounts.
+    """
+    return {doc_name: document_fields(doc_name) for doc_name in DOCUMENT_ORDER}
+
+# Worker processes for parallel rendering (env DOCUMENT_WORKERS overrides)
+RENDER_WORKERS = int(os.environ.get('DOCUMENT_WORKERS', 0)) or min(len(DOCUMENT_ORDER), os.cpu_count() or 1)
+
+# Process pool shared by all parallel renders, started on first use
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """The shared render pool, started on first use
+
+    Workers come from a forkserver (spawn on Windows) rather than a fork of
+    the multi-threaded Streamlit server, and stay up between bills so the
+    start-up, import and template loading cost is paid once.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                               mp_context=multiprocessing.get_context(start_method),
+                                               initializer=warm_up_renderer)
+        return _render_pool
+
+def warm_up_renderer():
+    """Load templates, fonts and page styles; run by each render worker as it starts"""
+    precompile_templates()
+    warm_up_pdf()
+
+def warm_up_render_pool():
+    """Start the render workers in the background so the first bill does not wait for them"""
+    pool = _get_render_pool()
+    for _ in range(RENDER_WORKERS):
+        pool.submit(time.sleep, 0.1)
+
+def _reset_render_pool():
+    """Drop a broken pool so the next parallel render starts a new one"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+def _render_document(doc_name: str, data: Dict[str, Any], temp_dir: str, pdf_mode: str,
+                     formats: Tuple[str, ...]) -> Tuple[Dict[str, str], Dict[str, bytes], float]:
+    """Generate one document and return its artifacts' content; runs in a render pool worker"""
+    start = time.perf_counter()
+    generator = DocumentGenerator(temp_dir=temp_dir, pdf_mode=pdf_mode, formats=formats)
+    try:
+        files = getattr(generator, f"generate_{doc_name}")(data)
+        contents = {name: generator.artifacts.read(name) for name in files.values()}
+    finally:
+        generator.artifacts.close()
+    return files, contents, time.perf_counter() - start
+
+def _render_docx(doc_name: str, data: Dict[str, Any], temp_dir: str,
+                 html: bytes) -> Tuple[Dict[str, str], Dict[str, bytes], float]:
+    """Build one document's Word file from its rendered HTML; runs in a render pool worker"""
+    start = time.perf_counter()
+    generator = DocumentGenerator(temp_dir=temp_dir, formats=('docx',))
+    try:
+        files = {}
+        html_file = generator.artifacts.write(f"{doc_name}.html", html)
+        orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+        generator._write_docx(html_file, doc_name, orientation, files, data)
+        contents = {name: generator.artifacts.read(name) for name in files.values()}
+    finally:
+        generator.artifacts.close()
+    return files, contents, time.perf_counter() - start
+
+def _render_combined_layout(data: Dict[str, Any], temp_dir: str,
+                            htmls: Dict[str, bytes]) -> Tuple[Optional[str], Dict[str, str], Dict[str, bytes], float]:
+    """Lay out the documents' HTML as the combined PDF in one pass; runs in a render pool worker
+
+    Returns the combined PDF's name, each document's PDF sliced from it and
+    their content; no name when the layout failed.
+    """
+    start = time.perf_counter()
+    generator = DocumentGenerator(temp_dir=temp_dir, pdf_mode='combined', formats=('pdf',))
+    try:
+        generator.data = data
+        documents = {doc_name: {'html': generator.artifacts.write(f"{doc_name}.html", html)}
+                     for doc_name, html in htmls.items()}
+        try:
+            combined_pdf_file = generator._layout_combined_pdf(documents, list(documents))
+        except Exception as e:
+            logger.error(f"Error laying out combined PDF: {str(e)}")
+            return None, {}, {}, time.perf_counter() - start
+        pdfs = {doc_name: files['pdf'] for doc_name, files in documents.items() if 'pdf' in files}
+        contents = {name: generator.artifacts.read(name) for name in [combined_pdf_file, *pdfs.values()]}
+    finally:
+        generator.artifacts.close()
+    return combined_pdf_file, pdfs, contents, time.perf_counter() - start
+
+class DocumentGenerator:
+    """Generates documents in multiple formats from processed data"""
+    
+    def __init__(self, temp_dir: Optional[str] = None, pdf_mode: Optional[str] = None,
+                 job: Optional[Job] = None, formats: Optional[Iterable[str]] = None,
+                 render_cache: Optional[RenderCache] = None):
+        self.template_dir = TEMPLATE_DIR
+        
+        # Files go into a workspace job: the caller's, or one this generator owns
+        # and deletes on close(). Render workers are handed their parent's directory.
+        self.owns_job = temp_dir is None and job is None
+        self.job = get_workspace().create_job('bill') if self.owns_job else job
+        self.temp_dir = temp_dir or self.job.path
+        
+        # How PDFs are produced, see PDF_MODES
+        self.pdf_mode = pdf_mode or os.environ.get(PDF_MODE_ENV_VAR) or 'combined'
+        if self.pdf_mode not in PDF_MODES:
+            raise ValueError(f"Unknown PDF mode '{self.pdf_mode}', expected one of {list(PDF_MODES)}")
         
-        # Add custom filters
-        self.jinja_env.filters['format_number'] = self._format_number
-        self.jinja_env.filters['format_currency'] = self._format_currency
-        self.jinja_env.filters['format_date'] = self._format_date
+        # Formats produced up front; the others are produced by ensure_format() when asked for
+        self.formats = set(OUTPUT_FORMATS if formats is None else formats) | {'html'}
+        unknown = self.formats - set(OUTPUT_FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown formats {sorted(unknown)}, expected some of {list(OUTPUT_FORMATS)}")
         
-        # Import number_to_words from formatters
-        from utils.formatters import number_to_words
-        self.jinja_env.filters['number_to_words'] = number_to_words
+        # The bill and the files generated for it, kept for formats produced later
+        self.data = None
+        self._preformatted = None
+        self.documents = {}
+        self.combined_files = {}
+        self._on_demand_lock = threading.RLock()
+        
+        # Seconds spent on each document by the last generate_all()
+        self.render_times = {}
+        
+        # Outputs already rendered for the same template and data are reused from here
+        self.render_cache = render_cache
+        self._fingerprinted_data = None
+        self._field_fingerprints = {}
+        
+        # Inputs of each generated document (see document_key), and what the
+        # last generate_all() took over unchanged and which fields it found changed
+        self.document_keys = {}
+        self.reused_documents = []
+        self.changed_fields = []
+        
+        # The previous generator while none of its documents changed, for its combined files
+        self._unchanged_previous = None
+        
+        # The combined PDF a render worker laid out during generate_all(), if any
+        self._combined_pdf = None
+        
+        # Shared Jinja2 environment, templates are compiled once per process
+        self.jinja_env = get_jinja_env()
+        
+        # Word tables are built from the data, with the same number and date formats
+        self.docx_builder = DocxBuilder(self._format_number, self._format_date)
+        
+        # Word documents generated in this process, merged without reading them back
+        self.docx_documents = {}
+        
+        # Generated files by name, in memory and spilled to temp_dir when large
+        self.artifacts = ArtifactStore(spill_dir=self.temp_dir,
+                                       track_disk=self.job.track_disk if self.job else None)
+        if self.job:
+            self.job.add_store(self.artifacts)
+    
+    def close(self):
+        """Free the artifacts, and the workspace job if this generator created it"""
+        self.artifacts.close()
+        if self.owns_job:
+            self.job.close()
+    
+    def _preformat(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """preformat_items(data), formatting the bill this generator was last given only once
+        
+        The formatted stores belong to this generator; the bill passed in,
+        which may be shared through the parse cache, is left as it is.
+        """
+        if self._preformatted is None or all(data is not known for known in self._preformatted):
+            self._preformatted = (data, preformat_items(data))
+        return self._preformatted[1]
     
     def generate_first_page(self, data: Dict[str, Any]) -> Dict[str, str]:
         """Generate First Page Summary in all formats"""
         try:
-            template = self.jinja_env.get_template('first_page.html')
-            html_content = template.render(data=data)
+            data = self._preformat(data)
             
             # Generate files
-            files = self._generate_all_formats(html_content, 'first_page', orientation='portrait')
+            files = self._generate_all_formats('first_page', data, orientation='portrait')
             
             logger.info("First page generated successfully")
             return files
@@ -60,11 +562,10 @@ class DocumentGenerator:
     def generate_deviation_statement(self, data: Dict[str, Any]) -> Dict[str, str]:
         """Generate Deviation Statement in all formats"""
         try:
-            template = self.jinja_env.get_template('deviation_statement.html')
-            html_content = template.render(data=data)
+            data = self._preformat(data)
             
             # Generate files (landscape orientation)
-            files = self._generate_all_formats(html_content, 'deviation_statement', orientation='landscape')
+            files = self._generate_all_formats('deviation_statement', data, orientation='landscape')
             
             logger.info("Deviation statement generated successfully")
             return files
@@ -76,11 +577,10 @@ class DocumentGenerator:
     def generate_note_sheet(self, data: Dict[str, Any]) -> Dict[str, str]:
         """Generate Note Sheet in all formats"""
         try:
-            template = self.jinja_env.get_template('note_sheet.html')
-            html_content = template.render(data=data)
+            data = self._preformat(data)
             
             # Generate files
-            files = self._generate_all_formats(html_content, 'note_sheet', orientation='portrait')
+            files = self._generate_all_formats('note_sheet', data, orientation='portrait')
             
             logger.info("Note sheet generated successfully")
             return files
@@ -92,11 +592,10 @@ class DocumentGenerator:
     def generate_extra_items(self, data: Dict[str, Any]) -> Dict[str, str]:
         """Generate Extra Items in all formats"""
         try:
-            template = self.jinja_env.get_template('extra_items.html')
-            html_content = template.render(data=data)
+            data = self._preformat(data)
             
             # Generate files
-            files = self._generate_all_formats(html_content, 'extra_items', orientation='portrait')
+            files = self._generate_all_formats('extra_items', data, orientation='portrait')
             
             logger.info("Extra items generated successfully")
             return files
@@ -108,11 +607,10 @@ class DocumentGenerator:
     def generate_certificate(self, data: Dict[str, Any]) -> Dict[str, str]:
         """Generate Certificate in all formats"""
         try:
-            template = self.jinja_env.get_template('certificate.html')
-            html_content = template.render(data=data)
+            data = self._preformat(data)
             
             # Generate files
-            files = self._generate_all_formats(html_content, 'certificate', orientation='portrait')
+            files = self._generate_all_formats('certificate', data, orientation='portrait')
             
             logger.info("Certificate generated successfully")
             return files
@@ -124,11 +622,10 @@ class DocumentGenerator:
     def generate_memorandum(self, data: Dict[str, Any]) -> Dict[str, str]:
         """Generate Memorandum in all formats"""
         try:
-            template = self.jinja_env.get_template('memorandum.html')
-            html_content = template.render(data=data)
+            data = self._preformat(data)
             
             # Generate files
-            files = self._generate_all_formats(html_content, 'memorandum', orientation='portrait')
+            files = self._generate_all_formats('memorandum', data, orientation='portrait')
             
             logger.info("Memorandum generated successfully")
             return files
@@ -137,126 +634,552 @@ class DocumentGenerator:
             logger.error(f"Error generating memorandum: {str(e)}")
             raise
     
+    def generate_all(self, data: Dict[str, Any], parallel: bool = False,
+                     progress: Optional[Callable[[str, int, int], None]] = None,
+                     doc_names: Optional[Iterable[str]] = None,
+                     previous: Optional['DocumentGenerator'] = None) -> Dict[str, Dict[str, str]]:
+        """Generate every document of the bill, returned in DOCUMENT_ORDER
+
+        The extra items document is skipped when the bill has no extra items,
+        and only doc_names are generated when given; ensure_format() produces
+        the others on request. With parallel=True the documents are rendered
+        concurrently in the shared process pool. progress(doc_name, done,
+        total) is called as each document completes.
+
+        In combined PDF mode the pool renders every document's HTML first;
+        one worker then lays out the combined PDF while the others build the
+        Word files (see _render_in_pool). In separate mode each worker also
+        renders its document's PDF.
+
+        previous is the generator of an earlier version of the bill, such as
+        the last upload. Documents whose fields (see dependency_graph) did not
+        change are copied from it; reused_documents lists them together with
+        those found in the render cache, and changed_fields the fields that
+        differ from the previous bill.
+        """
+        data = self._preformat(data)
+        requested = set(DOCUMENT_ORDER if doc_names is None else doc_names)
+        doc_names = [doc_name for doc_name in DOCUMENT_ORDER
+                     if doc_name in requested and (doc_name != 'extra_items' or data.get('extra_items'))]
+        documents = {}
+        self.render_times = {}
+        self.data = data
+        self._combined_pdf = None
+        self.document_keys = {doc_name: self.document_key(doc_name) for doc_name in doc_names}
+        self.changed_fields = self._changed_fields(previous) if previous is not None else []
+        
+        for doc_name in doc_names:
+            start = time.perf_counter()
+            files = self._reuse_document(doc_name, previous) or self._restore_document(doc_name, data)
+            if files is not None:
+                documents[doc_name] = files
+                self.render_times[doc_name] = time.perf_counter() - start
+                if progress:
+                    progress(doc_name, len(documents), len(doc_names))
+        self.reused_documents = list(documents)
+        if documents:
+            logger.info(f"Reused {len(documents)} of {len(doc_names)} unchanged documents")
+        if previous is not None and len(documents) == len(doc_names) and set(previous.documents) == set(doc_names):
+            self._unchanged_previous = previous
+        
+        if parallel and len(documents) < len(doc_names):
+            try:
+                self._render_in_pool(data, doc_names, documents, progress)
+            except BrokenProcessPool as e:
+                logger.error(f"Render pool failed ({str(e)}), generating the remaining documents one by one")
+                _reset_render_pool()
+        
+        for doc_name in doc_names:
+            if doc_name in documents:
+                continue
+            start = time.perf_counter()
+            documents[doc_name] = getattr(self, f"generate_{doc_name}")(data)
+            self._store_document(doc_name, data, documents[doc_name])
+            self.render_times[doc_name] = time.perf_counter() - start
+            if progress:
+                progress(doc_name, len(documents), len(doc_names))
+        
+        self.render_times = {doc_name: self.render_times[doc_name] for doc_name in doc_names}
+        self.documents = {doc_name: documents[doc_name] for doc_name in doc_names}
+        return self.documents
+    
+    def _render_in_pool(self, data: Dict[str, Any], doc_names: List[str], documents: Dict[str, Dict[str, str]],
+                        progress: Optional[Callable[[str, int, int], None]]):
+        """Render the documents of doc_names that are not in documents yet in the shared process pool
+        
+        In combined PDF mode each document's HTML is rendered first, then its
+        Word file in a job of its own. The combined PDF is laid out in one
+        pass as soon as every document's HTML is in, by one worker while the
+        others build the Word files, and its slices become the documents'
+        PDFs. In separate mode each job renders a whole document.
+        """
+        pool = _get_render_pool()
+        formats = tuple(sorted(self.formats))
+        layout_pdf = self.pdf_mode == 'combined' and 'pdf' in self.formats
+        futures = {pool.submit(_render_document, doc_name, data, self.temp_dir, self.pdf_mode,
+                               ('html',) if layout_pdf else formats): ('document', doc_name)
+                   for doc_name in doc_names if doc_name not in documents}
+        # Each document's files so far, from its HTML on
+        rendered = dict(documents)
+        pdfs = {}
+        combined_key = None
+        
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, doc_name = futures.pop(future)
+                if stage == 'layout':
+                    combined_pdf_file, pdfs, contents, layout_time = future.result()
+                    for name, content in contents.items():
+                        self.artifacts.write(name, content)
+                    if combined_pdf_file is not None:
+                        self._combined_pdf = combined_pdf_file
+                        logger.info(f"Combined PDF laid out in {layout_time:.2f}s")
+                    continue
+                
+                files, contents, render_time = future.result()
+                for name, content in contents.items():
+                    self.artifacts.write(name, content)
+                files = dict(rendered.get(doc_name, {}), **files)
+                self.render_times[doc_name] = self.render_times.get(doc_name, 0) + render_time
+                if stage == 'document' and layout_pdf and 'docx' in self.formats:
+                    rendered[doc_name] = files
+                    futures[pool.submit(_render_docx, doc_name, data, self.temp_dir,
+                                        contents[files['html']])] = ('docx', doc_name)
+                else:
+                    self._store_document(doc_name, data, files)
+                    rendered[doc_name] = documents[doc_name] = files
+                    if progress:
+                        progress(doc_name, len(documents), len(doc_names))
+                
+                if layout_pdf and stage == 'document' and all(name in rendered for name in doc_names):
+                    # The layout is reused while no document in it changed
+                    combined_key = self._combined_key(doc_names, 'pdf', 'combined')
+                    if combined_key and self._restore_combined_pdf(combined_key, rendered, doc_names):
+                        self._combined_pdf = "combined_bill.pdf"
+                        combined_key = None
+                    else:
+                        htmls = {name: self.artifacts.read(rendered[name]['html']) for name in doc_names}
+                        futures[pool.submit(_render_combined_layout, data, self.temp_dir, htmls)] = ('layout', None)
+        
+        for doc_name, pdf_file in pdfs.items():
+            documents[doc_name]['pdf'] = pdf_file
+        if self._combined_pdf is not None and combined_key:
+            self._store_combined_pdf(combined_key, documents, doc_names)
+    
     def create_combined_documents(self, documents: Dict[str, Dict[str, str]], data: Dict[str, Any]) -> Dict[str, str]:
-        """Create combined documents from individual documents"""
+        """Create combined documents from individual documents
+        
+        Only the generator's formats are combined now; ensure_format('combined',
+        ...) adds the others to the returned dict later.
+        """
         try:
-            # Order of documents for combination
-            doc_order = ['first_page', 'deviation_statement', 'note_sheet', 'extra_items', 'certificate', 'memorandum']
-            
-            # Create combined PDF
-            combined_pdf = self._create_combined_pdf(documents, doc_order)
-            
-            # Create combined Word document
-            combined_docx = self._create_combined_docx(documents, doc_order)
-            
-            # Create combined HTML
-            combined_html = self._create_combined_html(documents, doc_order)
-            
-            return {
-                'combined_pdf': combined_pdf,
-                'combined_docx': combined_docx,
-                'combined_html': combined_html
-            }
+            self.data = self._preformat(data)
+            self.documents = documents
+            self.combined_files = {}
+            with self._on_demand_lock:
+                for file_format in OUTPUT_FORMATS:
+                    if file_format in self.formats:
+                        self.combined_files[f"combined_{file_format}"] = (self._reuse_combined(file_format)
+                                                                          or self._create_combined(file_format))
+                self._unchanged_previous = None
+            return self.combined_files
             
         except Exception as e:
             logger.error(f"Error creating combined documents: {str(e)}")
             raise
     
-    def create_zip_package(self, combined_files: Dict[str, str], data: Dict[str, Any]) -> str:
-        """Create ZIP package with all generated files"""
+    def ensure_format(self, doc_name: str, file_format: str) -> str:
+        """Artifact name of a document in a format, producing it on first request
+        
+        doc_name is a document of DOCUMENT_ORDER or 'combined'. Files produced
+        here are added to documents and combined_files, so later calls and
+        the ZIP package find them.
+        """
+        with self._on_demand_lock:
+            if doc_name == 'combined':
+                key = f"combined_{file_format}"
+                if key not in self.combined_files:
+                    self.combined_files[key] = self._create_combined(file_format)
+                return self.combined_files[key]
+            
+            if doc_name not in self.documents:
+                if self.data is None:
+                    raise ValueError(f"No bill data to generate {doc_name} from")
+                files = self._restore_document(doc_name, self.data)
+                if files is None:
+                    files = getattr(self, f"generate_{doc_name}")(self.data)
+                    self._store_document(doc_name, self.data, files)
+                self.documents[doc_name] = files
+                self.document_keys[doc_name] = self.document_key(doc_name)
+            
+            files = self.documents[doc_name]
+            if file_format not in files:
+                orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+                if file_format == 'pdf' and self.pdf_mode == 'combined' and 'combined_pdf' not in self.combined_files:
+                    # Individual PDFs are sliced from the combined layout
+                    self.ensure_format('combined', 'pdf')
+                if file_format not in files and not self._restore_output(doc_name, file_format, orientation, files):
+                    if file_format == 'pdf':
+                        files['pdf'] = self._write_pdf(files['html'], doc_name, orientation)
+                    elif file_format == 'docx':
+                        self._write_docx(files['html'], doc_name, orientation, files, self.data)
+                    self._store_output(doc_name, file_format, orientation, files.get(file_format))
+            if file_format not in files:
+                raise RuntimeError(f"Could not generate {doc_name} as {file_format}")
+            return files[file_format]
+    
+    def ensure_all_formats(self) -> Dict[str, Dict[str, str]]:
+        """Produce every format of every generated document and of the combined files"""
+        with self._on_demand_lock:
+            for file_format in OUTPUT_FORMATS:
+                for doc_name in list(self.documents):
+                    self.ensure_format(doc_name, file_format)
+                self.ensure_format('combined', file_format)
+        return self.documents
+    
+    def _render_key(self, doc_name: str, file_format: str, layout: str) -> Optional[str]:
+        """Render cache key of a document's output, None without a cache or bill data
+        
+        The key covers the template source, the fields of the bill the output
+        is made from (the Word layout's own fields for DocxBuilder documents),
+        the format and the page layout.
+        """
+        if self.render_cache is None or self.data is None:
+            return None
+        source_hash, fields = template_info(f"{doc_name}.html")
+        if file_format == 'docx' and doc_name in DocxBuilder.DOCUMENTS:
+            fields = DocxBuilder.FIELDS[doc_name]
+        if file_format == 'pdf':
+            # Long tables are paginated differently with another chunk size
+            layout = f"{layout}-chunk{LAYOUT_CHUNK_ROWS}"
+        field_hashes = [f"{field}={self._field_fingerprint(field)}" for field in fields]
+        return render_key(f"v{RENDER_VERSION}", source_hash, *field_hashes, doc_name, file_format, layout)
+    
+    def document_key(self, doc_name: str) -> str:
+        """Hash of everything a document is generated from: templates, code version and its fields of the bill"""
+        source_hash, _ = template_info(f"{doc_name}.html")
+        field_hashes = [f"{field}={self._field_fingerprint(field)}" for field in document_fields(doc_name)]
+        return render_key(f"v{RENDER_VERSION}", source_hash, *field_hashes, doc_name, self.pdf_mode)
+    
+    def _field_fingerprint(self, field: str) -> str:
+        """Fingerprint of one field of the current bill, computed once per bill however many outputs read it"""
+        if self.data is not self._fingerprinted_data:
+            self._fingerprinted_data = self.data
+            self._field_fingerprints = {}
+        if field not in self._field_fingerprints:
+            self._field_fingerprints[field] = data_fingerprint(self.data, [field])
+        return self._field_fingerprints[field]
+    
+    def _reuse_document(self, doc_name: str, previous: Optional['DocumentGenerator']) -> Optional[Dict[str, str]]:
+        """Copy a document's files from the generator of the previous upload if its inputs are unchanged
+        
+        Formats the previous generator produced on demand are carried over
+        too. None when the document has to be generated.
+        """
+        if previous is None or previous.document_keys.get(doc_name) != self.document_keys[doc_name]:
+            return None
+        previous_files = previous.documents.get(doc_name, {})
+        if any(file_format not in previous_files for file_format in self._cached_formats(doc_name)):
+            return None
+        
+        files = {}
+        try:
+            for file_format, name in previous_files.items():
+                with self.artifacts.create(name) as output_file:
+                    previous.artifacts.copy_to(name, output_file)
+                files[file_format] = name
+        except KeyError:
+            # The previous generator was closed in the meantime
+            return None
+        return files
+    
+    def _reuse_combined(self, file_format: str) -> Optional[str]:
+        """Copy a combined file from the previous generator when none of the documents changed"""
+        previous = self._unchanged_previous
+        name = previous.combined_files.get(f"combined_{file_format}") if previous else None
+        if name is None:
+            return None
+        try:
+            with self.artifacts.create(name) as output_file:
+                previous.artifacts.copy_to(name, output_file)
+        except KeyError:
+            return None
+        return name
+    
+    def _changed_fields(self, previous: 'DocumentGenerator') -> List[str]:
+        """Fields of the dependency graph whose values differ from the previous generator's bill"""
+        if previous.data is None:
+            return []
+        fields = sorted({field for fields in dependency_graph().values() for field in fields})
+        return [field for field in fields if previous._field_fingerprint(field) != self._field_fingerprint(field)]
+    
+    def _combined_key(self, doc_names: List[str], file_format: str, layout: Optional[str] = None) -> Optional[str]:
+        """Render cache key of a combined file, None unless each of its documents has a key
+        
+        Parts use their own page orientation unless a layout is given.
+        """
+        keys = [self._render_key(doc_name, file_format,
+                                 layout or ('landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'))
+                for doc_name in doc_names]
+        return render_key('combined', *keys) if doc_names and all(keys) else None
+    
+    def _restore_output(self, doc_name: str, file_format: str, layout: str, files: Dict[str, str]) -> bool:
+        """Write a cached output to its artifact and add it to files; False on a miss"""
+        key = self._render_key(doc_name, file_format, layout)
+        content = self.render_cache.get(key) if key else None
+        if content is None:
+            return False
+        files[file_format] = self.artifacts.write(f"{doc_name}.{file_format}", content)
+        return True
+    
+    def _store_output(self, doc_name: str, file_format: str, layout: str, name: Optional[str]):
+        """Put a rendered artifact into the render cache"""
+        key = self._render_key(doc_name, file_format, layout)
+        if key and name in self.artifacts:
+            self.render_cache.put(key, self.artifacts.read(name))
+    
+    def _cached_formats(self, doc_name: str) -> List[str]:
+        """Formats generate_<doc_name>() produces up front, HTML first"""
+        formats = ['html']
+        if self.pdf_mode == 'separate' and 'pdf' in self.formats:
+            formats.append('pdf')
+        if 'docx' in self.formats:
+            formats.append('docx')
+        return formats
+    
+    def _restore_document(self, doc_name: str, data: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """A document's files from the render cache, or None unless every format is cached"""
+        if self.render_cache is None:
+            return None
+        self.data = data
+        orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+        contents = {}
+        for file_format in self._cached_formats(doc_name):
+            contents[file_format] = self.render_cache.get(self._render_key(doc_name, file_format, orientation))
+            if contents[file_format] is None:
+                return None
+        return {file_format: self.artifacts.write(f"{doc_name}.{file_format}", content)
+                for file_format, content in contents.items()}
+    
+    def _store_document(self, doc_name: str, data: Dict[str, Any], files: Dict[str, str]):
+        """Put the files generate_<doc_name>() produced into the render cache"""
+        if self.render_cache is None:
+            return
+        self.data = data
+        orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+        for file_format in self._cached_formats(doc_name):
+            self._store_output(doc_name, file_format, orientation, files.get(file_format))
+    
+    def _create_combined(self, file_format: str) -> str:
+        """Combine the documents in one format"""
+        # Order of documents for combination
+        doc_order = DOCUMENT_ORDER
+        if file_format == 'pdf':
+            if self.pdf_mode == 'combined':
+                # Laid out by a render worker during generate_all(), otherwise here
+                if self._combined_pdf is not None:
+                    return self._combined_pdf
+                return self._render_combined_pdf(self.documents, doc_order)
+            for doc_name in self.documents:
+                self.ensure_format(doc_name, 'pdf')
+            return self._create_combined_pdf(self.documents, doc_order)
+        
+        if file_format == 'docx':
+            for doc_name in self.documents:
+                self.ensure_format(doc_name, 'docx')
+            return self._create_combined_docx(self.documents, doc_order)
+        
+        return self._create_combined_html(self.documents, doc_order)
+    
+    def create_zip_package(self, combined_files: Dict[str, str], data: Dict[str, Any],
+                           target: Optional[Union[str, BinaryIO]] = None,
+                           documents: Optional[Dict[str, Dict[str, str]]] = None) -> Union[str, BinaryIO]:
+        """Create ZIP package with all generated files
+        
+        The combined files go in combined/ and, when documents are given,
+        each document's files in a folder per format, numbered in
+        DOCUMENT_ORDER (pdf/01_first_page.pdf, ...). By default the archive
+        is itself stored as an artifact and its name returned; with target
+        (a path or a writable file) it is written there instead.
+        """
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             agreement_no = data.get('title_info', {}).get('agreement_no', 'N_A')
+            # Agreement numbers such as "48/2024-25" are not valid file names
+            agreement_no = re.sub(r'[^\w.-]+', '_', str(agreement_no))
             
-            # Ensure the temp directory exists
-            os.makedirs(self.temp_dir, exist_ok=True)
+            entries = self._package_entries(combined_files, documents or {})
+            zip_name = f"bill_package_{agreement_no}_{timestamp}.zip"
+            if target is None:
+                with self.artifacts.create(zip_name) as zip_file:
+                    self._write_zip(zip_file, entries)
+                target = zip_name
+            else:
+                self._write_zip(target, entries)
             
-            zip_filename = os.path.join(self.temp_dir, f"bill_package_{agreement_no}_{timestamp}.zip")
-            
-            with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Add combined files
-                for file_type, file_path in combined_files.items():
-                    if os.path.exists(file_path):
-                        zipf.write(file_path, f"combined_{file_type.split('_')[-1]}")
-            
-            logger.info(f"ZIP package created: {zip_filename}")
-            return zip_filename
+            logger.info(f"ZIP package created: {target if isinstance(target, str) else zip_name}")
+            return target
             
         except Exception as e:
             logger.error(f"Error creating ZIP package: {str(e)}")
             raise
     
-    def _generate_all_formats(self, html_content: str, doc_name: str, orientation: str = 'portrait') -> Dict[str, str]:
-        """Generate PDF, DOCX, and HTML files from HTML content"""
+    def _package_entries(self, combined_files: Dict[str, str],
+                         documents: Dict[str, Dict[str, str]]) -> List[Tuple[str, str]]:
+        """(archive path, artifact name) of every file in the package, in archive order"""
+        entries = [(f"combined/{name}", name) for name in combined_files.values()]
+        for file_format in OUTPUT_FORMATS:
+            for number, doc_name in enumerate(DOCUMENT_ORDER, 1):
+                name = documents.get(doc_name, {}).get(file_format)
+                if name:
+                    entries.append((f"{file_format}/{number:02d}_{doc_name}.{file_format}", name))
+        return [(arcname, name) for arcname, name in entries if name in self.artifacts]
+    
+    def _write_zip(self, target: Union[str, BinaryIO], entries: List[Tuple[str, str]]):
+        """Write the package archive with per-entry compression
+        
+        Entries are prepared (read and classified) by threads a chunk at a
+        time. The next chunk is submitted before the current one is
+        compressed and written; zlib releases the GIL, so both proceed
+        together and at most two chunks of entries are held in memory.
+        """
+        chunks = [entries[start:start + ZIP_PREPARE_WORKERS] for start in range(0, len(entries), ZIP_PREPARE_WORKERS)]
+        with zipfile.ZipFile(target, 'w') as zipf, ThreadPoolExecutor(ZIP_PREPARE_WORKERS) as pool:
+            pending = [pool.submit(self._prepare_zip_entry, entry) for entry in chunks[0]] if chunks else []
+            for index in range(len(chunks)):
+                current = pending
+                next_chunk = chunks[index + 1] if index + 1 < len(chunks) else []
+                pending = [pool.submit(self._prepare_zip_entry, entry) for entry in next_chunk]
+                for future in current:
+                    arcname, content, compress_type, level = future.result()
+                    zipf.writestr(arcname, content, compress_type=compress_type, compresslevel=level)
+    
+    def _prepare_zip_entry(self, entry: Tuple[str, str]) -> Tuple[str, bytes, int, Optional[int]]:
+        """Content of one package entry with the compression method and level that suit it"""
+        arcname, name = entry
+        content = self.artifacts.read(name)
+        if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+            return arcname, content, zipfile.ZIP_STORED, None
+        
+        sample = content[:ZIP_SAMPLE_BYTES]
+        if sample and len(zlib.compress(sample, 1)) > len(sample) * (1 - ZIP_MIN_SAVING):
+            return arcname, content, zipfile.ZIP_STORED, None
+        
+        level = 9 if len(content) <= ZIP_SMALL_ENTRY_BYTES else 6
+        return arcname, content, zipfile.ZIP_DEFLATED, level
+    
+    def _generate_all_formats(self, doc_name: str, data: Dict[str, Any], orientation: str = 'portrait') -> Dict[str, str]:
+        """Generate the HTML file and the PDF and DOCX files of the requested formats
+        
+        The HTML is rendered straight into its artifact, and the PDF and DOCX
+        stages read that artifact's buffer rather than a copy of the page.
+        """
         files = {}
+        self.data = data
         
         # Save HTML file
-        html_file = os.path.join(self.temp_dir, f"{doc_name}.html")
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        files['html'] = html_file
+        files['html'] = self._render_html(doc_name, data)
         
-        # Generate PDF
-        pdf_file = os.path.join(self.temp_dir, f"{doc_name}.pdf")
-        try:
-            # Configure CSS for page setup
-            css_string = f"""
-            @page {{
-                size: A4 {orientation};
-                margin: 10mm;
-            }}
-            body {{
-                font-family: Arial, sans-serif;
-                font-size: 12px;
-                line-height: 1.4;
-            }}
-            """
-            
-            weasyprint.HTML(string=html_content).write_pdf(
-                pdf_file,
-                stylesheets=[weasyprint.CSS(string=css_string)]
-            )
-            files['pdf'] = pdf_file
-            
-        except Exception as e:
-            logger.error(f"Error generating PDF for {doc_name}: {str(e)}")
+        # Generate PDF; in combined mode it is sliced from the combined layout later
+        if self.pdf_mode == 'separate' and 'pdf' in self.formats:
+            try:
+                files['pdf'] = self._write_pdf(files['html'], doc_name, orientation)
+            except Exception as e:
+                logger.error(f"Error generating PDF for {doc_name}: {str(e)}")
         
         # Generate DOCX
-        docx_file = os.path.join(self.temp_dir, f"{doc_name}.docx")
+        if 'docx' in self.formats:
+            self._write_docx(files['html'], doc_name, orientation, files, data)
+        
+        return files
+    
+    def _render_html(self, doc_name: str, data: Dict[str, Any]) -> str:
+        """Render a document's template into its HTML artifact piece by piece and return the name
+        
+        The template is streamed in batches of RENDER_BUFFER_PIECES pieces
+        that are encoded and written as they come, so the page never exists
+        as one string.
+        """
+        html_file = f"{doc_name}.html"
+        stream = self.jinja_env.get_template(html_file).stream(data=data)
+        stream.enable_buffering(RENDER_BUFFER_PIECES)
+        with self.artifacts.create(html_file) as output_file:
+            stream.dump(output_file, encoding='utf-8')
+        return html_file
+    
+    def _write_docx(self, html_file: str, doc_name: str, orientation: str,
+                    files: Dict[str, str], data: Optional[Dict[str, Any]] = None):
+        """Build one document's Word file and add it to files
+        
+        Documents DocxBuilder knows are built in Word straight from data,
+        the others from the lines of their HTML artifact.
+        """
+        docx_file = f"{doc_name}.docx"
         try:
-            self._html_to_docx(html_content, docx_file, orientation)
+            with self.artifacts.create(docx_file) as output_file:
+                if data is not None and doc_name in DocxBuilder.DOCUMENTS:
+                    document = self.docx_builder.build(doc_name, data)
+                    document.save(output_file)
+                else:
+                    with self.artifacts.reader(html_file) as source:
+                        html_lines = io.TextIOWrapper(source, encoding='utf-8', newline='\n')
+                        document = self._html_to_docx(html_lines, output_file, orientation)
+                        html_lines.detach()
+            self.docx_documents[doc_name] = document
             files['docx'] = docx_file
             
         except Exception as e:
             logger.error(f"Error generating DOCX for {doc_name}: {str(e)}")
+    
+    def _write_pdf(self, html_file: str, doc_name: str, orientation: str = 'portrait') -> str:
+        """Render one document from its HTML artifact to its own PDF artifact"""
+        pdf_file = f"{doc_name}.pdf"
+        with pdf_resources() as resources, self.artifacts.create(pdf_file) as output_file:
+            chunks = self._layout_chunks(doc_name)
+            if chunks:
+                self._layout_chunked(doc_name, orientation, chunks, resources).write_pdf(output_file)
+            else:
+                with self.artifacts.reader(html_file) as source:
+                    resources.render(source, orientation).write_pdf(output_file)
+        return pdf_file
+    
+    def _layout_chunks(self, doc_name: str) -> Optional[List[Tuple[slice, 'LayoutChunk']]]:
+        """Chunks of a document's item table when it is long enough to lay out in chunks, else None"""
+        table = CHUNKED_DOCUMENTS.get(doc_name)
+        if table is None or self.data is None or not LAYOUT_CHUNK_ROWS:
+            return None
+        rows = self.data.get(table.field)
+        if rows is None or len(rows) <= LAYOUT_CHUNK_ROWS:
+            return None
+        return layout_chunks(rows, table.totals, LAYOUT_CHUNK_ROWS)
+    
+    def _layout_chunked(self, doc_name: str, orientation: str, chunks: List[Tuple[slice, 'LayoutChunk']],
+                        resources: PdfResources):
+        """Lay out each chunk of a document on its own and return one document of all their pages
         
-        return files
+        Each chunk is the template rendered with that chunk's rows, so layout
+        time grows with the number of chunks rather than faster than the
+        number of rows.
+        """
+        template = self.jinja_env.get_template(f"{doc_name}.html")
+        field = CHUNKED_DOCUMENTS[doc_name].field
+        rows = self.data[field]
+        documents = []
+        for bounds, chunk in chunks:
+            html_content = template.render(data=dict(self.data, **{field: rows[bounds]}), chunk=chunk)
+            documents.append(resources.render(html_content, orientation))
+        return documents[0].copy([page for document in documents for page in document.pages])
     
-    def _html_to_docx(self, html_content: str, output_file: str, orientation: str = 'portrait'):
-        """Convert HTML content to DOCX format"""
+    def _html_to_docx(self, html_lines: Iterable[str], output_file: Union[str, BinaryIO], orientation: str = 'portrait'):
+        """Convert HTML content, given line by line, to DOCX format and return the document"""
         try:
-            doc = Document()
-            
-            # Set page orientation and margins
-            section = doc.sections[0]
-            section.page_height = Mm(297)  # A4 height
-            section.page_width = Mm(210)   # A4 width
-            
-            if orientation == 'landscape':
-                section.orientation = WD_ORIENT.LANDSCAPE
-                section.page_height = Mm(210)
-                section.page_width = Mm(297)
-            
-            # Set margins to 10mm
-            section.top_margin = Mm(10)
-            section.bottom_margin = Mm(10)
-            section.left_margin = Mm(10)
-            section.right_margin = Mm(10)
+            # A4 page in the given orientation with 10mm margins
+            doc = new_document(orientation)
             
             # Simple HTML to DOCX conversion
             # This is a basic implementation - for production use, consider using python-docx-template
-            lines = html_content.split('\n')
-            for line in lines:
+            for line in html_lines:
                 if line.strip():
                     # Remove HTML tags for basic conversion
                     clean_line = self._strip_html_tags(line)
@@ -265,6 +1188,7 @@ class DocumentGenerator:
                         p.alignment = WD_ALIGN_PARAGRAPH.LEFT
             
             doc.save(output_file)
+            return doc
             
         except Exception as e:
             logger.error(f"Error converting HTML to DOCX: {str(e)}")
@@ -281,19 +1205,18 @@ class DocumentGenerator:
         try:
             import PyPDF2
             
-            combined_pdf_file = os.path.join(self.temp_dir, "combined_bill.pdf")
+            combined_pdf_file = "combined_bill.pdf"
             
-            with open(combined_pdf_file, 'wb') as output_file:
+            with self.artifacts.create(combined_pdf_file) as output_file:
                 pdf_writer = PyPDF2.PdfWriter()
                 
                 for doc_name in doc_order:
                     if doc_name in documents and 'pdf' in documents[doc_name]:
-                        pdf_path = documents[doc_name]['pdf']
-                        if os.path.exists(pdf_path):
-                            with open(pdf_path, 'rb') as pdf_file:
-                                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                                for page in pdf_reader.pages:
-                                    pdf_writer.add_page(page)
+                        pdf_name = documents[doc_name]['pdf']
+                        if pdf_name in self.artifacts:
+                            pdf_reader = PyPDF2.PdfReader(io.BytesIO(self.artifacts.read(pdf_name)))
+                            for page in pdf_reader.pages:
+                                pdf_writer.add_page(page)
                 
                 pdf_writer.write(output_file)
             
@@ -307,42 +1230,189 @@ class DocumentGenerator:
                     return documents[doc_name]['pdf']
             raise
     
+    def _render_combined_pdf(self, documents: Dict[str, Dict[str, str]], doc_order: List[str]) -> str:
+        """Lay out all documents in one WeasyPrint pass and slice the individual PDFs from it
+        
+        The layout comes from the render cache while no document in it
+        changed; if it fails, each document is rendered on its own and the
+        PDFs are merged.
+        """
+        try:
+            combined_pdf_file = "combined_bill.pdf"
+            doc_names = [doc_name for doc_name in doc_order
+                         if doc_name in documents and documents[doc_name].get('html') in self.artifacts]
+            
+            # The layout is reused while no document in it changed
+            combined_key = self._combined_key(doc_names, 'pdf', 'combined')
+            if combined_key and self._restore_combined_pdf(combined_key, documents, doc_names):
+                return combined_pdf_file
+            
+            self._layout_combined_pdf(documents, doc_names)
+            if combined_key:
+                self._store_combined_pdf(combined_key, documents, doc_names)
+            return combined_pdf_file
+            
+        except Exception as e:
+            logger.error(f"Error rendering combined PDF: {str(e)}, rendering documents separately")
+            for doc_name in doc_order:
+                if doc_name in documents and 'pdf' not in documents[doc_name]:
+                    try:
+                        orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+                        documents[doc_name]['pdf'] = self._write_pdf(documents[doc_name]['html'], doc_name, orientation)
+                    except Exception as e:
+                        logger.error(f"Error generating PDF for {doc_name}: {str(e)}")
+            return self._create_combined_pdf(documents, doc_order)
+    
+    def _layout_combined_pdf(self, documents: Dict[str, Dict[str, str]], doc_names: List[str]) -> str:
+        """Write the combined PDF of doc_names and each document's PDF sliced from it
+        
+        Each document becomes a section with its own scoped styles, landscape
+        documents go on the named 'landscape' page. Fonts are loaded and
+        subset once, and each document's PDF is the page range of its section.
+        Documents with a long item table are laid out in chunks instead (see
+        LAYOUT_CHUNK_ROWS) and their pages put in place among the sections'.
+        """
+        combined_pdf_file = "combined_bill.pdf"
+        
+        # Long item tables are laid out on their own, in chunks, and their pages stitched in
+        chunks = {doc_name: self._layout_chunks(doc_name) for doc_name in doc_names}
+        sections = [doc_name for doc_name in doc_names if not chunks[doc_name]]
+        with pdf_resources() as resources:
+            pages = {}
+            document = None
+            if sections:
+                # The layout's HTML is assembled in an artifact of its own, dropped once laid out
+                layout_file = "combined_layout.html"
+                with self.artifacts.create(layout_file) as raw_file:
+                    self._write_combined_pdf_html(documents, sections, raw_file)
+                try:
+                    with self.artifacts.reader(layout_file) as source:
+                        document = resources.render(source, 'combined')
+                finally:
+                    self.artifacts.discard(layout_file)
+                
+                # A section's anchor is on every page it spans, the first one is where it starts
+                start_pages = {}
+                for page_number, page in enumerate(document.pages):
+                    for anchor in page.anchors:
+                        if anchor.startswith('doc-'):
+                            start_pages.setdefault(anchor[4:], page_number)
+                
+                starts = sorted((page_number, doc_name) for doc_name, page_number in start_pages.items())
+                for index, (first_page, doc_name) in enumerate(starts):
+                    last_page = starts[index + 1][0] if index + 1 < len(starts) else len(document.pages)
+                    pages[doc_name] = document.pages[first_page:last_page]
+            
+            for doc_name in doc_names:
+                if chunks[doc_name]:
+                    orientation = 'landscape' if doc_name in LANDSCAPE_DOCUMENTS else 'portrait'
+                    chunked_document = self._layout_chunked(doc_name, orientation, chunks[doc_name], resources)
+                    pages[doc_name] = chunked_document.pages
+                    document = document or chunked_document
+            if len(sections) < len(doc_names):
+                document = document.copy([page for doc_name in doc_names for page in pages.get(doc_name, [])])
+            
+            with self.artifacts.create(combined_pdf_file) as output_file:
+                document.write_pdf(output_file)
+            for doc_name, doc_pages in pages.items():
+                pdf_file = f"{doc_name}.pdf"
+                with self.artifacts.create(pdf_file) as output_file:
+                    document.copy(doc_pages).write_pdf(output_file)
+                documents[doc_name]['pdf'] = pdf_file
+        return combined_pdf_file
+    
+    def _store_combined_pdf(self, combined_key: str, documents: Dict[str, Dict[str, str]], doc_names: List[str]):
+        """Put the combined PDF and its slices into the render cache"""
+        for doc_name in doc_names:
+            if 'pdf' in documents[doc_name]:
+                self.render_cache.put(render_key(combined_key, doc_name),
+                                      self.artifacts.read(documents[doc_name]['pdf']))
+        self.render_cache.put(combined_key, self.artifacts.read("combined_bill.pdf"))
+    
+    def _restore_combined_pdf(self, combined_key: str, documents: Dict[str, Dict[str, str]],
+                              doc_names: List[str]) -> bool:
+        """Write the cached combined PDF and its slices to artifacts; False unless all are cached"""
+        contents = {doc_name: self.render_cache.get(render_key(combined_key, doc_name)) for doc_name in doc_names}
+        combined = self.render_cache.get(combined_key)
+        if combined is None or any(content is None for content in contents.values()):
+            return False
+        self.artifacts.write("combined_bill.pdf", combined)
+        for doc_name, content in contents.items():
+            documents[doc_name]['pdf'] = self.artifacts.write(f"{doc_name}.pdf", content)
+        return True
+    
+    def _write_combined_pdf_html(self, documents: Dict[str, Dict[str, str]], doc_names: List[str], raw_file: BinaryIO):
+        """Write one HTML document holding every document as a page-breaking section
+        
+        Each document's styles are scoped to its section; the bodies are
+        copied from the documents' buffers as bytes, without decoding them.
+        """
+        styles = []
+        for doc_name in doc_names:
+            scope = f".doc-{doc_name}"
+            with self.artifacts.view(documents[doc_name]['html']) as content:
+                for css in re.findall(rb'<style[^>]*>(.*?)</style>', content, re.S | re.I):
+                    styles.append(self._scope_css(css.decode('utf-8'), scope))
+        
+        css = '\n'.join(styles)
+        raw_file.write(('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="UTF-8">\n<title>Combined Bill</title>\n'
+                        f'<style>\n{css}\n</style>\n</head>\n<body>\n').encode('utf-8'))
+        for doc_name in doc_names:
+            raw_file.write(f'<section id="doc-{doc_name}" class="doc-section doc-{doc_name}">'.encode('utf-8'))
+            with self.artifacts.view(documents[doc_name]['html']) as content, memoryview(content) as buffer:
+                body = re.search(rb'<body[^>]*>(.*)</body>', content, re.S | re.I)
+                raw_file.write(buffer[body.start(1):body.end(1)] if body else buffer)
+            raw_file.write(b'</section>')
+        raw_file.write(b'\n</body>\n</html>\n')
+    
+    def _scope_css(self, css: str, scope: str) -> str:
+        """Limit a template stylesheet to its section, so rules of different templates do not collide"""
+        def scope_rule(match):
+            selectors = []
+            for selector in match.group(1).split(','):
+                # The template's body is its section
+                selector = re.sub(r'^(html|body)\b\s*', '', selector.strip())
+                selectors.append(f"{scope} {selector}" if selector else scope)
+            return f"{', '.join(selectors)} {{{match.group(2)}}}"
+        
+        return re.sub(r'([^{}@]+)\{([^{}]*)\}', scope_rule, css)
+    
     def _create_combined_docx(self, documents: Dict[str, Dict[str, str]], doc_order: List[str]) -> str:
-        """Create combined DOCX from individual DOCX files"""
+        """Create combined DOCX by merging the body XML of the individual documents
+        
+        Each document stays a section of its own, so the deviation statement
+        keeps its landscape pages. Documents generated in this process are
+        taken from memory; those rendered by pool workers are loaded from
+        their artifacts.
+        """
         try:
             from docx import Document
-            from docx.oxml import OxmlElement
             
-            combined_docx_file = os.path.join(self.temp_dir, "combined_bill.docx")
-            combined_doc = Document()
+            combined_docx_file = "combined_bill.docx"
+            doc_names = [doc_name for doc_name in doc_order
+                         if doc_name in documents and 'docx' in documents[doc_name]]
             
-            for doc_name in doc_order:
-                if doc_name in documents and 'docx' in documents[doc_name]:
-                    docx_path = documents[doc_name]['docx']
-                    if os.path.exists(docx_path):
-                        doc = Document(docx_path)
-                        
-                        # Add page break before each document (except first)
-                        if doc_name != doc_order[0]:
-                            combined_doc.add_page_break()
-                        
-                        # Copy paragraphs
-                        for paragraph in doc.paragraphs:
-                            new_paragraph = combined_doc.add_paragraph(paragraph.text)
-                            new_paragraph.style = paragraph.style
-                        
-                        # Copy tables
-                        for table in doc.tables:
-                            new_table = combined_doc.add_table(
-                                rows=len(table.rows),
-                                cols=len(table.columns)
-                            )
-                            
-                            for i, row in enumerate(table.rows):
-                                for j, cell in enumerate(row.cells):
-                                    new_table.cell(i, j).text = cell.text
+            combined_key = self._combined_key(doc_names, 'docx')
+            content = self.render_cache.get(combined_key) if combined_key else None
+            if content is not None:
+                for doc_name in doc_names:
+                    self.docx_documents.pop(doc_name, None)
+                return self.artifacts.write(combined_docx_file, content)
             
-            combined_doc.save(combined_docx_file)
+            parts = []
+            for doc_name in doc_names:
+                # Merging empties the in-memory documents, so each is used once
+                document = self.docx_documents.pop(doc_name, None)
+                if document is None and documents[doc_name]['docx'] in self.artifacts:
+                    document = Document(io.BytesIO(self.artifacts.read(documents[doc_name]['docx'])))
+                if document is not None:
+                    parts.append(document)
+            
+            combined_doc = merge_documents(parts) if parts else Document()
+            with self.artifacts.create(combined_docx_file) as output_file:
+                combined_doc.save(output_file)
+            if combined_key:
+                self.render_cache.put(combined_key, self.artifacts.read(combined_docx_file))
             return combined_docx_file
             
         except Exception as e:
@@ -356,9 +1426,10 @@ class DocumentGenerator:
     def _create_combined_html(self, documents: Dict[str, Dict[str, str]], doc_order: List[str]) -> str:
         """Create combined HTML from individual HTML files"""
         try:
-            combined_html_file = os.path.join(self.temp_dir, "combined_bill.html")
+            combined_html_file = "combined_bill.html"
             
-            with open(combined_html_file, 'w', encoding='utf-8') as output_file:
+            with self.artifacts.create(combined_html_file) as raw_file:
+                output_file = io.TextIOWrapper(raw_file, encoding='utf-8')
                 output_file.write("""
 <!DOCTYPE html>
 <html>
@@ -376,23 +1447,22 @@ class DocumentGenerator:
                 
                 for i, doc_name in enumerate(doc_order):
                     if doc_name in documents and 'html' in documents[doc_name]:
-                        html_path = documents[doc_name]['html']
-                        if os.path.exists(html_path):
+                        html_name = documents[doc_name]['html']
+                        if html_name in self.artifacts:
                             if i > 0:
                                 output_file.write('<div class="page-break"></div>')
                             
                             output_file.write(f'<div class="document-section">')
                             
-                            with open(html_path, 'r', encoding='utf-8') as input_file:
-                                content = input_file.read()
-                                # Extract body content
-                                body_start = content.find('<body>')
-                                body_end = content.find('</body>')
+                            # Extract body content, copied from the document's buffer as it is
+                            output_file.flush()
+                            with self.artifacts.view(html_name) as content, memoryview(content) as buffer:
+                                body_start = content.find(b'<body>')
+                                body_end = content.find(b'</body>')
                                 if body_start != -1 and body_end != -1:
-                                    body_content = content[body_start + 6:body_end]
-                                    output_file.write(body_content)
+                                    raw_file.write(buffer[body_start + 6:body_end])
                                 else:
-                                    output_file.write(content)
+                                    raw_file.write(buffer)
                             
                             output_file.write('</div>')
                 
@@ -400,6 +1470,8 @@ class DocumentGenerator:
 </body>
 </html>
                 """)
+                # Leave the artifact open when the wrapper goes away
+                output_file.detach()
             
             return combined_html_file
             
@@ -407,29 +1479,25 @@ class DocumentGenerator:
             logger.error(f"Error creating combined HTML: {str(e)}")
             raise
     
-    def _format_number(self, value: Any, decimals: int = 2) -> str:
-        """Format number with specified decimal places"""
+    @staticmethod
+    def _format_number(value: Any, decimals: int = 2) -> str:
+        """Format number with specified decimal places, as format_numbers does for the '_fmt' columns"""
         try:
             if isinstance(value, (int, float)):
-                return f"{value:.{decimals}f}"
+                return format_numbers([value], decimals)[0]
             elif isinstance(value, str):
-                return f"{float(value):.{decimals}f}"
+                return format_numbers([float(value)], decimals)[0]
         except:
             pass
         return "0.00"
     
-    def _format_currency(self, value: Any) -> str:
+    @staticmethod
+    def _format_currency(value: Any) -> str:
         """Format currency with Indian numbering system"""
-        try:
-            if isinstance(value, (int, float)):
-                return f"₹{value:,.2f}"
-            elif isinstance(value, str):
-                return f"₹{float(value):,.2f}"
-        except:
-            pass
-        return "₹0.00"
+        return format_currency(value)
     
-    def _format_date(self, date_str: str) -> str:
+    @staticmethod
+    def _format_date(date_str: str) -> str:
         """Format date to dd/mm/yyyy format"""
         try:
             if isinstance(date_str, str) and date_str not in ['N/A', '']:
@@ -0,0 +1,401 @@
+import copy
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.enum.section import WD_ORIENT
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Mm, Pt, Twips
+
+from utils.item_store import FORMATTED_DECIMALS, ItemStore
+
+# Printable width of an A4 page with 10mm margins
+CONTENT_WIDTH_MM = {'portrait': 190, 'landscape': 277}
+
+TWIPS_PER_MM = 1440 / 25.4
+
+# Characters Word does not accept in document XML
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+CELL_END = '</w:t></w:r></w:p></w:tc>'
+
+
+class TableColumn(NamedTuple):
+    """A column of an item table"""
+    header: str
+    width: float                    # relative width, scaled to the page
+    field: Optional[str] = None     # item field shown; None leaves the cell blank
+    decimals: Optional[int] = None  # format the field as a number
+    align: str = 'center'
+
+
+FIRST_PAGE_COLUMNS = [
+    TableColumn('Unit', 11.7, 'unit'),
+    TableColumn('Quantity executed (or supplied) since last certificate', 16, 'quantity', 2),
+    TableColumn('Quantity executed (or supplied) upto date as per MB', 16, 'quantity', 2),
+    TableColumn('Item No.', 11.1, 'item_no'),
+    TableColumn('Item of Work supplies (Grouped under "sub-head" and "sub work" of estimate)', 74.2,
+                'description', align='left'),
+    TableColumn('Rate', 15.3, 'rate', 2),
+    TableColumn('Amount upto date', 22.7, 'amount', 2),
+    TableColumn('Amount Since previous bill (Total for each sub-head)', 17.6, 'amount', 2),
+    TableColumn('Remark', 13.9, 'remark'),
+]
+
+DEVIATION_COLUMNS = [
+    TableColumn('ITEM No.', 6, 'item_no'),
+    TableColumn('Description', 95, 'description', align='left'),
+    TableColumn('Unit', 10, 'unit'),
+    TableColumn('Qty as per Work Order', 10, 'wo_quantity', 2),
+    TableColumn('Rate', 12, 'wo_rate', 2),
+    TableColumn('Amt as per Work Order Rs.', 12, 'wo_amount', 2),
+    TableColumn('Qty Executed', 12, 'exec_quantity', 2),
+    TableColumn('Amt as per Executed Rs.', 12, 'exec_amount', 2),
+    TableColumn('Excess Qty', 12, 'excess_quantity', 2),
+    TableColumn('Excess Amt Rs.', 12, 'excess_amount', 2),
+    TableColumn('Saving Qty', 12, 'saving_quantity', 2),
+    TableColumn('Saving Amt Rs.', 12, 'saving_amount', 2),
+    TableColumn('REMARKS/ REASON.', 40, 'remarks', align='left'),
+]
+
+EXTRA_ITEM_COLUMNS = [
+    TableColumn('S.No.', 10, 'item_no'),
+    TableColumn('Description', 50, 'description', align='left'),
+    TableColumn('Unit', 8, 'unit'),
+    TableColumn('Quantity', 10, 'quantity', 2),
+    TableColumn('Rate', 12, 'rate', 2),
+    TableColumn('Amount', 10, 'amount', 2),
+]
+
+
+def new_document(orientation: str = 'portrait'):
+    """An empty A4 Word document with 10mm margins"""
+    document = Document()
+    section = document.sections[0]
+    section.page_height = Mm(297)  # A4 height
+    section.page_width = Mm(210)   # A4 width
+
+    if orientation == 'landscape':
+        section.orientation = WD_ORIENT.LANDSCAPE
+        section.page_height = Mm(210)
+        section.page_width = Mm(297)
+
+    section.top_margin = Mm(10)
+    section.bottom_margin = Mm(10)
+    section.left_margin = Mm(10)
+    section.right_margin = Mm(10)
+    return document
+
+
+def merge_documents(documents: List):
+    """Append the bodies of documents to the first one, each as its own section
+
+    Body elements are moved, so the later documents are emptied. Each
+    document ends in a section break carrying its own page size and
+    orientation, and styles missing from the first document are copied over.
+    The documents must not reference images or other related parts.
+    """
+    master = documents[0]
+    body = master.element.body
+    styles = master.styles.element
+    style_ids = {style.get(qn('w:styleId')) for style in styles.iterchildren(qn('w:style'))}
+
+    for document in documents[1:]:
+        # Close the section so far with its own properties, in a paragraph of its own
+        section_properties = body.find(qn('w:sectPr'))
+        section_break = OxmlElement('w:p')
+        paragraph_properties = OxmlElement('w:pPr')
+        paragraph_properties.append(copy.deepcopy(section_properties))
+        section_break.append(paragraph_properties)
+        section_properties.addprevious(section_break)
+
+        part_body = document.element.body
+        part_section_properties = part_body.find(qn('w:sectPr'))
+        for element in list(part_body):
+            if element is not part_section_properties:
+                # lxml moves a subtree to another document in time quadratic in its
+                # size, so a table is moved row by row into a new table element
+                moved = body.makeelement(element.tag, element.attrib)
+                section_properties.addprevious(moved)
+                for child in list(element):
+                    moved.append(child)
+        # The last document's page setup applies to the final section
+        body.replace(section_properties, part_section_properties)
+
+        for style in document.styles.element.iterchildren(qn('w:style')):
+            if style.get(qn('w:styleId')) not in style_ids:
+                styles.append(copy.deepcopy(style))
+                style_ids.add(style.get(qn('w:styleId')))
+
+    return master
+
+
+class DocxBuilder:
+    """Builds Word documents with native tables straight from the bill data
+
+    Item rows are written as one block of table XML per table instead of
+    cell by cell, so build time grows linearly with the number of items.
+    Text fields of an ItemStore are escaped once per distinct value.
+    """
+
+    # Documents with a data-driven layout
+    DOCUMENTS = ('first_page', 'deviation_statement', 'extra_items')
+
+    # Fields of the bill data each layout reads ('field' or 'field.key')
+    FIELDS = {
+        'first_page': ('title_info.contractor_name', 'title_info.work_name', 'title_info.agreement_no',
+                       'title_info.date_of_commencement', 'title_info.date_of_completion',
+                       'work_order_amount', 'bill_quantity_items', 'extra_items', 'total_amount'),
+        'deviation_statement': ('deviation_data', 'work_order_amount', 'total_amount'),
+        'extra_items': ('title_info.agreement_no', 'extra_items', 'work_order_amount')
+    }
+
+    def __init__(self, format_number: Callable[..., str], format_date: Callable[[Any], str]):
+        # The template filters, so numbers and dates read the same as in HTML and PDF
+        self.format_number = format_number
+        self.format_date = format_date
+
+    def build(self, doc_name: str, data: Dict[str, Any]):
+        """The Word document for doc_name, one of DOCUMENTS"""
+        return getattr(self, f"build_{doc_name}")(data)
+
+    def build_first_page(self, data: Dict[str, Any]):
+        """First Page Summary with the bill quantity and extra item tables"""
+        title_info = data.get('title_info', {})
+        extra_items = data.get('extra_items', [])
+        document = new_document('portrait')
+
+        self._add_header(document, ['CONTRACTOR BILL',
+                                    'FOR CONTRACTORS & SUPPLIERS ONLY FOR PAYMENT FOR WORK OR SUPPLIES ACTUALLY MEASURED',
+                                    'WORK ORDER'])
+        self._add_fields(document, [
+            ('Cash Book Voucher No.', '_____________   Date: _____________'),
+            ('Name of Contractor or supplier:', title_info.get('contractor_name', '')),
+            ('Name of Work:', title_info.get('work_name', '')),
+            ('Serial No. of this bill:', 'First & Final Bill'),
+            ('No. and date of the last bill:', 'Not Applicable'),
+            ('Reference to work order or Agreement:', title_info.get('agreement_no', '')),
+            ('Date of written order to commence work:', self.format_date(title_info.get('date_of_commencement', ''))),
+            ('Date of actual completion of work:', self.format_date(title_info.get('date_of_completion', ''))),
+            ('WORK ORDER AMOUNT RS.', self.format_number(data.get('work_order_amount', 0), 0)),
+        ])
+
+        style = self._cell_style(document, 7)
+        table = self._add_item_table(document, FIRST_PAGE_COLUMNS, data.get('bill_quantity_items', []), 'portrait', style)
+        if len(extra_items):
+            widths = self._widths(FIRST_PAGE_COLUMNS, 'portrait')
+            aligns = ['center', 'left', 'center', 'center', 'center', 'center']
+            self._append_xml(table, self._row_xml(['', 'Extra Items (With Premium)', '', '', '', ''],
+                                                  widths, aligns, style, spans=[4, 1, 1, 1, 1, 1], bold=True))
+            self._append_xml(table, self._item_rows_xml(FIRST_PAGE_COLUMNS, extra_items, style))
+
+        summary = [('Grand Total Rs.', self.format_number(data.get('total_amount', 0), 2), True)]
+        if len(extra_items):
+            summary.append(('Sum of Extra Items Rs.', self.format_number(self._sum(extra_items, 'amount'), 2), False))
+        summary.append(('Payable Amount Rs.', self.format_number(data.get('total_amount', 0), 2), True))
+        self._add_summary(document, summary, 'portrait')
+        return document
+
+    def build_deviation_statement(self, data: Dict[str, Any]):
+        """Deviation Statement on a landscape page"""
+        deviation_data = data.get('deviation_data', [])
+        work_order_amount = data.get('work_order_amount', 0)
+        total_amount = data.get('total_amount', 0)
+        document = new_document('landscape')
+
+        self._add_header(document, ['DEVIATION STATEMENT'])
+        style = self._cell_style(document, 6)
+        table = self._add_item_table(document, DEVIATION_COLUMNS, deviation_data, 'landscape', style)
+
+        totals = [self.format_number(self._sum(deviation_data, column.field), 2) if column.decimals else ''
+                  for column in DEVIATION_COLUMNS[3:12]]
+        totals[1] = ''  # no total for the rate column
+        self._append_xml(table, self._row_xml(['Grand Total Rs.'] + totals + [''],
+                                              self._widths(DEVIATION_COLUMNS, 'landscape'),
+                                              [column.align for column in DEVIATION_COLUMNS[2:]], style,
+                                              spans=[3] + [1] * 10, bold=True))
+
+        deviation = total_amount - work_order_amount
+        percentage = deviation / work_order_amount * 100 if work_order_amount else 0
+        self._add_summary(document, [
+            ('Total Work Order Amount Rs.', self.format_number(work_order_amount, 2), True),
+            ('Total Executed Amount Rs.', self.format_number(total_amount, 2), True),
+            ('Overall Saving/Excess Rs.', self.format_number(deviation, 2), True),
+            ('Percentage of Deviation %', f"{self.format_number(percentage, 2)}%", True),
+        ], 'landscape')
+        return document
+
+    def build_extra_items(self, data: Dict[str, Any]):
+        """Extra Items statement"""
+        extra_items = data.get('extra_items', [])
+        work_order_amount = data.get('work_order_amount', 0)
+        document = new_document('portrait')
+
+        self._add_header(document, ['EXTRA ITEMS', f"Agreement No. {data.get('title_info', {}).get('agreement_no', '')}"])
+        if not len(extra_items):
+            paragraph = document.add_paragraph()
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            paragraph.add_run('No Extra Items found in this bill.').bold = True
+            return document
+
+        style = self._cell_style(document, 8)
+        table = self._add_item_table(document, EXTRA_ITEM_COLUMNS, extra_items, 'portrait', style)
+        total = self._sum(extra_items, 'amount')
+        self._append_xml(table, self._row_xml(
+            ['Total Extra Items', self.format_number(self._sum(extra_items, 'quantity'), 2), self.format_number(total, 2)],
+            self._widths(EXTRA_ITEM_COLUMNS, 'portrait'), ['center'] * 3, style, spans=[4, 1, 1], bold=True))
+
+        percentage = total / work_order_amount * 100 if work_order_amount else 0
+        self._add_summary(document, [
+            ('Total Extra Items Amount Rs.', self.format_number(total, 2), True),
+            ('Percentage of Extra Items', f"{self.format_number(percentage, 2)}%", False),
+        ], 'portrait')
+        self._add_fields(document, [
+            ('Note:', 'All extra items have been approved by the competent authority.'),
+            ('Justification:', 'Extra items were necessary for the completion of the work as per site requirements.'),
+        ])
+        return document
+
+    def _add_header(self, document, lines: List[str]):
+        """Centered title lines, the first one bold and larger"""
+        for index, line in enumerate(lines):
+            paragraph = document.add_paragraph()
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            run = paragraph.add_run(line)
+            run.bold = True
+            if index == 0:
+                run.font.size = Pt(14)
+
+    def _add_fields(self, document, fields: List[tuple]):
+        """'Label value' paragraphs with bold labels"""
+        for label, value in fields:
+            paragraph = document.add_paragraph()
+            paragraph.add_run(label).bold = True
+            paragraph.add_run(f" {value}")
+
+    def _add_summary(self, document, rows: List[tuple], orientation: str):
+        """Right-aligned two column table of (label, amount, bold) rows"""
+        document.add_paragraph()
+        widths = [round(CONTENT_WIDTH_MM[orientation] * share * TWIPS_PER_MM) for share in (0.25, 0.15)]
+        table = self._new_table(document, widths)
+        table.alignment = WD_TABLE_ALIGNMENT.RIGHT
+        style = self._cell_style(document, 9)
+        self._append_xml(table, ''.join(self._row_xml([label, amount], widths, ['left', 'right'], style, bold=bold)
+                                        for label, amount, bold in rows))
+
+    def _add_item_table(self, document, columns: List[TableColumn], items: Sequence, orientation: str,
+                        style: str):
+        """A bordered table with a repeating header row and one row per item"""
+        widths = self._widths(columns, orientation)
+        table = self._new_table(document, widths)
+        header = self._row_xml([column.header for column in columns], widths, ['center'] * len(columns),
+                               style, bold=True, header=True)
+        self._append_xml(table, header + self._item_rows_xml(columns, items, style))
+        return table
+
+    def _cell_style(self, document, font_size: float) -> str:
+        """Id of a centered, unspaced paragraph style for table cells, added on first use
+
+        Cells refer to the style instead of repeating spacing and size, which
+        keeps the XML of large tables small.
+        """
+        name = f"Table Cell {font_size:g}pt"
+        if name not in [style.name for style in document.styles]:
+            style = document.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+            style.font.size = Pt(font_size)
+            style.paragraph_format.space_before = Pt(0)
+            style.paragraph_format.space_after = Pt(0)
+            style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        return document.styles[name].style_id
+
+    def _new_table(self, document, widths: List[int]):
+        table = document.add_table(rows=0, cols=len(widths))
+        table.style = 'Table Grid'
+        # Fixed layout: Word uses the given widths instead of measuring every cell
+        table.autofit = False
+        for grid_column, width in zip(table._tbl.tblGrid.gridCol_lst, widths):
+            grid_column.w = Twips(width)
+        return table
+
+    def _widths(self, columns: List[TableColumn], orientation: str) -> List[int]:
+        """Column widths in twips, scaled to fill the printable width"""
+        scale = CONTENT_WIDTH_MM[orientation] * TWIPS_PER_MM / sum(column.width for column in columns)
+        return [round(column.width * scale) for column in columns]
+
+    def _item_rows_xml(self, columns: List[TableColumn], items: Sequence, style: str) -> str:
+        """XML for one table row per item, built column by column"""
+        if not len(items):
+            return ''
+        # Widths come from the table grid, so item cells carry no properties
+        prefixes = [self._cell_start(style, column.align) for column in columns]
+        texts = [self._column_text(items, column) for column in columns]
+        return ''.join('<w:tr>' + ''.join(prefix + text + CELL_END for prefix, text in zip(prefixes, row)) + '</w:tr>'
+                       for row in zip(*texts))
+
+    def _column_text(self, items: Sequence, column: TableColumn) -> List[str]:
+        """The escaped cell text of one column for every item"""
+        if isinstance(items, ItemStore):
+            if column.field not in items.fields:
+                return [''] * len(items)
+            formatted = items.formatted_column(column.field) if column.decimals == FORMATTED_DECIMALS else None
+            if formatted is not None:
+                return formatted.values[formatted.codes].tolist()
+            if column.decimals is not None:
+                return [self.format_number(value, column.decimals) for value in items.column(column.field).tolist()]
+            codes, values = items.text_column(column.field)
+            escaped = [self._escape(value) for value in values]
+            return [escaped[code] for code in codes.tolist()]
+
+        if column.field is None:
+            return [''] * len(items)
+        if column.decimals is not None:
+            return [self.format_number(item.get(column.field, 0), column.decimals) for item in items]
+        return [self._escape(item.get(column.field, '')) for item in items]
+
+    def _row_xml(self, texts: List[str], widths: List[int], aligns: List[str], style: str,
+                 spans: Optional[List[int]] = None, bold: bool = False, header: bool = False) -> str:
+        """XML for a single row; spans merges grid columns into one cell"""
+        spans = spans or [1] * len(texts)
+        cells = []
+        column = 0
+        for text, span, align in zip(texts, spans, aligns):
+            width = sum(widths[column:column + span])
+            column += span
+            cells.append(self._cell_start(style, align, span, width, bold) + self._escape(text) + CELL_END)
+        row_properties = '<w:trPr><w:tblHeader/></w:trPr>' if header else ''
+        return f"<w:tr>{row_properties}{''.join(cells)}</w:tr>"
+
+    def _cell_start(self, style: str, align: str, span: int = 1, width: Optional[int] = None,
+                    bold: bool = False) -> str:
+        """Opening XML of a table cell up to its text"""
+        cell_properties = ''
+        if width is not None or span > 1:
+            cell_properties = '<w:tcPr>'
+            if width is not None:
+                cell_properties += f'<w:tcW w:w="{width}" w:type="dxa"/>'
+            if span > 1:
+                cell_properties += f'<w:gridSpan w:val="{span}"/>'
+            cell_properties += '</w:tcPr>'
+        justification = f'<w:jc w:val="{align}"/>' if align != 'center' else ''
+        run_properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+        return (f'<w:tc>{cell_properties}<w:p><w:pPr><w:pStyle w:val="{style}"/>{justification}</w:pPr>'
+                f'<w:r>{run_properties}<w:t xml:space="preserve">')
+
+    def _append_xml(self, table, rows_xml: str):
+        """Parse row XML in one go and append the rows to the table"""
+        if rows_xml:
+            rows = parse_xml(f'<w:tbl {nsdecls("w")}>{rows_xml}</w:tbl>')
+            table._tbl.extend(list(rows))
+
+    def _escape(self, value: Any) -> str:
+        return escape(INVALID_XML_CHARS.sub('', str(value)))
+
+    def _sum(self, items: Sequence, field: str) -> float:
+        if isinstance(items, ItemStore):
+            return float(items.column(field).sum())
+        return sum(item.get(field, 0) for item in items)
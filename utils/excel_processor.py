@@ -1,30 +1,117 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
 import logging
+import re
+
+from utils.item_store import ItemStore, MoneyColumn
+from utils.money import PAISE_PER_RUPEE, percentage_to_rupees, to_paise, to_rupees
+from utils.workbook_reader import (ReaderBackend, StreamingWorkbook, WorkbookReadError, WorkbookSource,
+                                   as_readable, resolve_reader_backends, workbook_path)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever process_file output changes; part of the ParseCache key
+PROCESSOR_VERSION = 4
+
+# Item sheets only use the first six columns (item no ... amount)
+ITEM_COLUMNS = 6
+
+# Fields of the item stores built from those columns, plus the matching key
+ITEM_FIELDS = ('item_no', 'description', 'unit', 'quantity', 'rate', 'amount', 'item_key')
+ITEM_TEXT_FIELDS = ('item_no', 'description', 'unit', 'item_key')
+
+# Digit runs are zero-padded to this width in natural sort keys
+SORT_KEY_DIGITS = 12
+DIGIT_RUN = re.compile(r'\d+')
+
+# Statutory deductions: (rate in basis points, round to even rupee). Each is
+# rounded half up to whole rupees; GST is then raised to the next even rupee.
+DEDUCTION_RULES = {
+    'sd': (1000, False),  # Security Deposit
+    'it': (200, False),   # Income Tax
+    'gst': (200, True),   # GST
+    'lc': (100, False)    # Labour Cess
+}
+
 class ExcelProcessor:
     """Processes Excel files to extract bill generation data"""
     
-    def __init__(self):
+    def __init__(self, reader: Optional[str] = None):
+        # 'auto' (default), 'calamine', 'streaming' or 'openpyxl'; see utils.workbook_reader
+        self.reader_backends = resolve_reader_backends(reader)
+        self.reader_backend = None
+        self._reset()
+    
+    def _reset(self):
+        """Clear data extracted by a previous (or failed) read"""
         self.file_format = None
         self.title_data = {}
-        self.work_order_items = []
-        self.bill_quantity_items = []
-        self.extra_items = []
+        self.work_order_items = self._empty_items()
+        self.bill_quantity_items = self._empty_items()
+        self.extra_items = self._empty_items()
+        # Strings shared by the item stores of the workbook being read, dropped once it is processed
+        self._strings = {}
     
-    def process_file(self, file_path: str) -> Dict[str, Any]:
-        """Main method to process Excel file"""
+    def process_file(self, source: WorkbookSource) -> Dict[str, Any]:
+        """Main method to process Excel file
+
+        Accepts a path, the workbook bytes (bytes, bytearray, memoryview) or a
+        binary file such as BytesIO; in-memory data is parsed without a temp file.
+        """
         try:
-            # Read Excel file
-            excel_file = pd.ExcelFile(file_path)
+            # Read Excel file, falling back to the next reader on failure
+            for attempt, backend in enumerate(self.reader_backends):
+                try:
+                    self._read_workbook(backend, source)
+                    self.reader_backend = backend.name
+                    break
+                except Exception as e:
+                    if attempt == len(self.reader_backends) - 1:
+                        raise
+                    logger.warning(f"Reader '{backend.name}' failed ({str(e)}), "
+                                   f"retrying with '{self.reader_backends[attempt + 1].name}'")
+                    self._reset()
+            
+            # Calculate totals and deductions in exact paise
+            totals = self._calculate_totals()
+            deductions = self._calculate_deductions(totals['total_paise'])
+            
+            return {
+                'file_format': self.file_format,
+                'title_info': self.title_data,
+                'work_order_items': self.work_order_items,
+                'bill_quantity_items': self.bill_quantity_items,
+                'extra_items': self.extra_items,
+                'total_amount': totals['total_amount'],
+                'work_order_amount': totals['work_order_amount'],
+                'deviation_data': self._calculate_deviation_data(),
+                'deductions': deductions,
+                'net_payable': self._calculate_net_payable(totals['total_paise'], deductions)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error processing file: {str(e)}")
+            raise
+        finally:
+            self._strings = {}
+    
+    def _read_workbook(self, backend: ReaderBackend, source: WorkbookSource):
+        """Extract title and item data with one reader backend"""
+        if backend.requires_path:
+            with workbook_path(source) as path:
+                self._read_opened_workbook(backend, path)
+        else:
+            self._read_opened_workbook(backend, as_readable(source))
+    
+    def _read_opened_workbook(self, backend: ReaderBackend, source: Any):
+        """Extract title and item data from a path or readable file"""
+        with backend.open(source) as excel_file:
             sheet_names = excel_file.sheet_names
             
-            logger.info(f"Processing file with sheets: {sheet_names}")
+            logger.info(f"Processing file with sheets: {sheet_names} (reader: {backend.name})")
             
             # Detect file format
             self.file_format = self._detect_file_format(sheet_names)
@@ -42,26 +129,21 @@ class ExcelProcessor:
             
             # Extract extra items if available
             self._extract_extra_items(excel_file)
-            
-            # Calculate totals
-            totals = self._calculate_totals()
-            
-            return {
-                'file_format': self.file_format,
-                'title_info': self.title_data,
-                'work_order_items': self.work_order_items,
-                'bill_quantity_items': self.bill_quantity_items,
-                'extra_items': self.extra_items,
-                'total_amount': totals['total_amount'],
-                'work_order_amount': totals['work_order_amount'],
-                'deviation_data': self._calculate_deviation_data(),
-                'deductions': self._calculate_deductions(totals['total_amount']),
-                'net_payable': self._calculate_net_payable(totals['total_amount'])
-            }
-            
+    
+    def _parse_sheet(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile], sheet_name: str,
+                     header: Optional[int], max_col: Optional[int] = None) -> pd.DataFrame:
+        """Read a sheet, raising WorkbookReadError if the reader fails"""
+        try:
+            if isinstance(excel_file, StreamingWorkbook):
+                return excel_file.parse(sheet_name, header=header, max_col=max_col)
+            return excel_file.parse(sheet_name, header=header)
         except Exception as e:
-            logger.error(f"Error processing file: {str(e)}")
-            raise
+            raise WorkbookReadError(f"Could not read sheet '{sheet_name}': {str(e)}") from e
+    
+    def _parse_item_sheet(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile], sheet_name: str) -> pd.DataFrame:
+        """Read an item sheet (header in row 2)"""
+        # Cells right of the amount column are never used
+        return self._parse_sheet(excel_file, sheet_name, header=1, max_col=ITEM_COLUMNS)
     
     def _detect_file_format(self, sheet_names: List[str]) -> str:
         """Detect if file is Old Pattern or New Pattern with Title sheet"""
@@ -71,11 +153,11 @@ class ExcelProcessor:
         else:
             return "Old Pattern"
     
-    def _process_new_pattern(self, excel_file: pd.ExcelFile):
+    def _process_new_pattern(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile]):
         """Process New Pattern files with Title sheet"""
         try:
             # Read Title sheet
-            title_df = excel_file.parse('Title', header=None)
+            title_df = self._parse_sheet(excel_file, 'Title', header=None)
             
             # Extract key information from Title sheet
             self.title_data = self._extract_title_data(title_df)
@@ -84,7 +166,7 @@ class ExcelProcessor:
             logger.error(f"Error processing Title sheet: {str(e)}")
             raise
     
-    def _process_old_pattern(self, excel_file: pd.ExcelFile):
+    def _process_old_pattern(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile]):
         """Process Old Pattern files without Title sheet"""
         # For old pattern, we need to extract basic info from other sheets
         # This is a fallback method
@@ -139,116 +221,169 @@ class ExcelProcessor:
         
         return title_info
     
-    def _extract_work_order_data(self, excel_file: pd.ExcelFile):
+    def _extract_work_order_data(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile]):
         """Extract data from Work Order sheet"""
         try:
             if 'Work Order' in excel_file.sheet_names:
-                work_order_df = excel_file.parse('Work Order', header=1)  # Header in row 2
-                
-                # Process each row
-                for index, row in work_order_df.iterrows():
-                    # Skip empty rows
-                    if row.isna().all():
-                        continue
-                    
-                    # Extract item data (include items with any non-zero quantity)
-                    item_data = self._extract_item_data(row, 'work_order')
-                    if item_data and item_data['quantity'] > 0:
-                        self.work_order_items.append(item_data)
-                            
+                work_order_df = self._parse_item_sheet(excel_file, 'Work Order')
+                self.work_order_items = self._extract_items(work_order_df)
+            
+        except WorkbookReadError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting work order data: {str(e)}")
     
-    def _extract_bill_quantity_data(self, excel_file: pd.ExcelFile):
+    def _extract_bill_quantity_data(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile]):
         """Extract data from Bill Quantity sheet"""
         try:
             if 'Bill Quantity' in excel_file.sheet_names:
-                bill_quantity_df = excel_file.parse('Bill Quantity', header=1)  # Header in row 2
-                
-                # Process each row
-                for index, row in bill_quantity_df.iterrows():
-                    # Skip empty rows
-                    if row.isna().all():
-                        continue
-                    
-                    # Extract item data (include items with any non-zero quantity)
-                    item_data = self._extract_item_data(row, 'bill_quantity')
-                    if item_data and item_data['quantity'] > 0:
-                        self.bill_quantity_items.append(item_data)
-                            
+                bill_quantity_df = self._parse_item_sheet(excel_file, 'Bill Quantity')
+                self.bill_quantity_items = self._extract_items(bill_quantity_df)
+            
+        except WorkbookReadError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting bill quantity data: {str(e)}")
     
-    def _extract_extra_items(self, excel_file: pd.ExcelFile):
+    def _extract_extra_items(self, excel_file: Union[StreamingWorkbook, pd.ExcelFile]):
         """Extract extra items data if available"""
         try:
             if 'Extra Items' in excel_file.sheet_names:
-                extra_items_df = excel_file.parse('Extra Items', header=1)
-                
-                # Process each row
-                for index, row in extra_items_df.iterrows():
-                    # Skip empty rows
-                    if row.isna().all():
-                        continue
-                    
-                    # Extract item data (include items with any non-zero quantity)
-                    item_data = self._extract_item_data(row, 'extra_items')
-                    if item_data and item_data['quantity'] > 0:
-                        self.extra_items.append(item_data)
-                            
+                extra_items_df = self._parse_item_sheet(excel_file, 'Extra Items')
+                self.extra_items = self._extract_items(extra_items_df)
+            
+        except WorkbookReadError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting extra items data: {str(e)}")
     
-    def _extract_item_data(self, row: pd.Series, sheet_type: str) -> Optional[Dict[str, Any]]:
-        """Extract item data from a row"""
-        try:
-            # Common structure for all sheet types
-            item_data = {
-                'item_no': self._safe_get_value(row, 0),
-                'description': self._safe_get_value(row, 1),
-                'unit': self._safe_get_value(row, 2),
-                'quantity': self._safe_get_numeric_value(row, 3),
-                'rate': self._safe_get_numeric_value(row, 4),
-                'amount': self._safe_get_numeric_value(row, 5)
-            }
-            
-            # Calculate amount if not provided
-            if item_data['amount'] == 0 and item_data['quantity'] > 0 and item_data['rate'] > 0:
-                item_data['amount'] = item_data['quantity'] * item_data['rate']
-            
-            # Only include items with non-zero quantities or amounts
-            if item_data['quantity'] > 0 or item_data['amount'] > 0:
-                return item_data
-            
-        except Exception as e:
-            logger.error(f"Error extracting item data: {str(e)}")
+    def _empty_items(self) -> ItemStore:
+        """Item store with no rows"""
+        return ItemStore({name: np.array([], dtype=object) if name in ITEM_TEXT_FIELDS
+                          else MoneyColumn(to_paise([])) if name == 'amount'
+                          else np.zeros(0) for name in ITEM_FIELDS})
+    
+    def _extract_items(self, df: pd.DataFrame) -> ItemStore:
+        """Extract item records from a sheet using whole-column operations"""
+        # Skip empty rows
+        df = df.dropna(how='all')
+        if df.empty:
+            return self._empty_items()
         
-        return None
+        # Rows of an all-numeric sheet come back as floats
+        if all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes) and df.to_numpy().dtype.kind == 'f':
+            df = df.astype(float)
+        
+        # Columns: item no, description, unit, quantity, rate, amount
+        item_no = self._text_column(df, 0)
+        description = self._text_column(df, 1)
+        unit = self._text_column(df, 2)
+        quantity = self._numeric_column(df, 3)
+        rate = self._numeric_column(df, 4)
+        amount = self._numeric_column(df, 5)
+        
+        # Calculate amount if not provided
+        amount = np.where((amount == 0) & (quantity > 0) & (rate > 0), quantity * rate, amount)
+        
+        # Keys are assigned before filtering so sub-items keep their parent
+        item_key = self._item_keys(item_no)
+        
+        # Only include items with non-zero quantities
+        keep = quantity > 0
+        
+        columns = dict(zip(ITEM_FIELDS, (item_no, description, unit, quantity, rate, amount, item_key)))
+        columns = {name: column[keep] for name, column in columns.items()}
+        # Amounts are kept as exact paise, rounded half up
+        columns['amount'] = MoneyColumn(to_paise(columns['amount']))
+        return ItemStore(columns, self._strings)
     
-    def _safe_get_value(self, row: pd.Series, index: int) -> str:
-        """Safely get value from row"""
-        try:
-            if index < len(row) and pd.notna(row.iloc[index]):
-                return str(row.iloc[index]).strip()
-        except:
-            pass
-        return ""
+    def _text_column(self, df: pd.DataFrame, index: int) -> np.ndarray:
+        """Get column as stripped strings, empty where missing"""
+        if index >= df.shape[1]:
+            return np.full(len(df), "", dtype=object)
+        column = df.iloc[:, index]
+        return column.map(lambda value: str(value).strip(), na_action='ignore').fillna("").to_numpy(dtype=object)
+    
+    def _numeric_column(self, df: pd.DataFrame, index: int) -> np.ndarray:
+        """Get column as floats, 0.0 where missing or not a number"""
+        if index >= df.shape[1]:
+            return np.zeros(len(df))
+        column = df.iloc[:, index]
+        
+        if pd.api.types.is_numeric_dtype(column):
+            return column.astype(float).fillna(0.0).to_numpy()
+        
+        values = np.zeros(len(df))
+        if not pd.api.types.is_object_dtype(column):
+            # Dates and other non-numeric cells count as zero
+            return values
+        
+        is_str = column.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        is_number = column.map(lambda value: isinstance(value, (int, float))).to_numpy(dtype=bool)
+        is_number &= column.notna().to_numpy() & ~is_str
+        
+        # Strings: remove commas and convert in one pass
+        if is_str.any():
+            cleaned = column[is_str].str.replace(',', '', regex=False).str.strip().to_numpy(dtype=object)
+            parsed = pd.to_numeric(cleaned, errors='coerce').astype(float)
+            # Strings the fast path rejected get the scalar conversion
+            empty = cleaned == ''
+            retry = np.isnan(parsed) & ~empty
+            if retry.any():
+                parsed[retry] = [self._parse_float(value) for value in cleaned[retry]]
+            parsed[empty] = 0.0
+            values[is_str] = parsed
+        
+        # Plain Python numbers mixed into the column
+        if is_number.any():
+            values[is_number] = column[is_number].astype(float).to_numpy()
+        
+        return values
+    
+    def _item_keys(self, item_no: np.ndarray) -> np.ndarray:
+        """Normalized, unique item number of every row of a sheet
+
+        "3", "3.0" and " 3. " all become "3". Rows without a number are
+        sub-items of the last numbered row and get "<parent>#<ordinal>".
+        A key seen again in the same sheet gets "@<occurrence>", so the nth
+        duplicate in the work order pairs with the nth one in the bill.
+        """
+        keys = pd.Series([self._normalize_item_no(value) for value in item_no], dtype=object)
+        
+        blank = (keys == '').to_numpy()
+        if blank.any():
+            group = np.cumsum(~blank)
+            parent = keys.where(~blank).ffill().fillna('')
+            ordinal = pd.Series(blank.astype(int)).groupby(group).cumsum().astype(str)
+            keys = keys.where(~blank, parent + '#' + ordinal)
+        
+        occurrence = keys.groupby(keys).cumcount().to_numpy()
+        if occurrence.any():
+            duplicate = occurrence > 0
+            keys[duplicate] = keys[duplicate] + '@' + (occurrence[duplicate] + 1).astype(str)
+        
+        return keys.to_numpy(dtype=object)
+    
+    def _normalize_item_no(self, item_no: str) -> str:
+        """Item number without case, spaces or a trailing dot"""
+        key = ''.join(item_no.lower().split()).rstrip('.')
+        # Whole numbers read from numeric cells come back as "3.0"
+        whole, dot, fraction = key.partition('.')
+        if dot and fraction and whole.isdigit() and not fraction.strip('0'):
+            return whole
+        return key
     
-    def _safe_get_numeric_value(self, row: pd.Series, index: int) -> float:
-        """Safely get numeric value from row"""
+    def _natural_sort_keys(self, item_keys: np.ndarray) -> np.ndarray:
+        """Keys that sort hierarchical numbers naturally ("2.9" before "2.10")"""
+        return np.array([DIGIT_RUN.sub(lambda match: match.group().zfill(SORT_KEY_DIGITS), key)
+                         for key in item_keys], dtype=object)
+    
+    def _parse_float(self, value: str) -> float:
+        """Convert a cleaned string to float, 0.0 if not a number"""
         try:
-            if index < len(row) and pd.notna(row.iloc[index]):
-                value = row.iloc[index]
-                if isinstance(value, (int, float)):
-                    return float(value)
-                elif isinstance(value, str):
-                    # Remove commas and convert to float
-                    cleaned_value = value.replace(',', '').strip()
-                    if cleaned_value:
-                        return float(cleaned_value)
+            return float(value)
         except:
-            pass
-        return 0.0
+            return 0.0
     
     def _parse_amount(self, amount_str: str) -> float:
         """Parse amount string to float"""
@@ -264,102 +399,78 @@ class ExcelProcessor:
             pass
         return 0.0
     
-    def _calculate_totals(self) -> Dict[str, float]:
+    def _calculate_totals(self) -> Dict[str, Any]:
         """Calculate totals from all items"""
-        total_amount = 0.0
-        work_order_amount = 0.0
-        
-        # Sum from bill quantity items
-        for item in self.bill_quantity_items:
-            total_amount += item.get('amount', 0)
-        
-        # Sum from extra items
-        for item in self.extra_items:
-            total_amount += item.get('amount', 0)
+        # Sum from bill quantity and extra items, exact in paise
+        total_paise = int(self.bill_quantity_items.paise('amount').sum() + self.extra_items.paise('amount').sum())
         
         # Work order amount from title or work order items
         work_order_amount = self.title_data.get('work_order_amount', 0)
         if work_order_amount == 0:
-            for item in self.work_order_items:
-                work_order_amount += item.get('amount', 0)
+            work_order_amount = float(to_rupees(self.work_order_items.paise('amount').sum()))
         
         return {
-            'total_amount': total_amount,
+            'total_paise': total_paise,
+            'total_amount': float(to_rupees(total_paise)),
             'work_order_amount': work_order_amount
         }
     
-    def _calculate_deviation_data(self) -> List[Dict[str, Any]]:
+    def _calculate_deviation_data(self) -> ItemStore:
         """Calculate deviation data comparing work order vs executed quantities"""
-        deviation_data = []
+        wo_items = self.work_order_items
+        bill_items = self.bill_quantity_items
         
-        # Create lookup for bill quantities
-        bill_lookup = {item.get('item_no', ''): item for item in self.bill_quantity_items}
+        # Join on the normalized item key (unique per sheet); -1 where not billed
+        matched = pd.Index(bill_items.column('item_key')).get_indexer(wo_items.column('item_key'))
+        billed = matched >= 0
+        unmatched = len(bill_items) - np.count_nonzero(billed)
+        if unmatched:
+            logger.info(f"{unmatched} bill quantity item(s) have no work order item and are left out of the deviation")
         
-        # Process work order items
-        for wo_item in self.work_order_items:
-            item_no = wo_item.get('item_no', '')
-            bill_item = bill_lookup.get(item_no, {})
-            
-            wo_qty = wo_item.get('quantity', 0)
-            wo_rate = wo_item.get('rate', 0)
-            wo_amount = wo_qty * wo_rate
-            
-            exec_qty = bill_item.get('quantity', 0)
-            exec_rate = bill_item.get('rate', wo_rate)
-            exec_amount = exec_qty * exec_rate
-            
-            # Calculate excess/saving
-            excess_qty = max(0, exec_qty - wo_qty)
-            excess_amount = excess_qty * exec_rate
-            
-            saving_qty = max(0, wo_qty - exec_qty)
-            saving_amount = saving_qty * exec_rate
-            
-            deviation_data.append({
-                'item_no': item_no,
-                'description': wo_item.get('description', ''),
-                'unit': wo_item.get('unit', ''),
-                'wo_quantity': wo_qty,
-                'wo_rate': wo_rate,
-                'wo_amount': wo_amount,
-                'exec_quantity': exec_qty,
-                'exec_rate': exec_rate,
-                'exec_amount': exec_amount,
-                'excess_quantity': excess_qty,
-                'excess_amount': excess_amount,
-                'saving_quantity': saving_qty,
-                'saving_amount': saving_amount
-            })
+        wo_qty = wo_items.column('quantity')
+        wo_rate = wo_items.column('rate')
+        wo_amount = wo_qty * wo_rate
         
-        return deviation_data
-    
-    def _calculate_deductions(self, total_amount: float) -> Dict[str, float]:
-        """Calculate statutory deductions"""
-        deductions = {
-            'sd_rate': 10.0,  # Security Deposit
-            'it_rate': 2.0,   # Income Tax
-            'gst_rate': 2.0,  # GST
-            'lc_rate': 1.0    # Labour Cess
-        }
+        # Unbilled items (-1) pick the zero appended after the last bill row
+        exec_qty = np.append(bill_items.column('quantity'), 0.0)[matched]
+        exec_rate = np.where(billed, np.append(bill_items.column('rate'), 0.0)[matched], wo_rate)
+        exec_amount = exec_qty * exec_rate
         
-        deductions['sd_amount'] = round(total_amount * deductions['sd_rate'] / 100)
-        deductions['it_amount'] = round(total_amount * deductions['it_rate'] / 100)
-        deductions['gst_amount'] = round(total_amount * deductions['gst_rate'] / 100)
-        # Round GST to next even number
-        if deductions['gst_amount'] % 2 != 0:
-            deductions['gst_amount'] += 1
-        deductions['lc_amount'] = round(total_amount * deductions['lc_rate'] / 100)
+        # Calculate excess/saving
+        excess_qty = np.maximum(0.0, exec_qty - wo_qty)
+        saving_qty = np.maximum(0.0, wo_qty - exec_qty)
+        
+        deviation = ItemStore({
+            'item_no': wo_items.text_column('item_no'),
+            'description': wo_items.text_column('description'),
+            'unit': wo_items.text_column('unit'),
+            'wo_quantity': wo_qty,
+            'wo_rate': wo_rate,
+            'wo_amount': MoneyColumn(to_paise(wo_amount)),
+            'exec_quantity': exec_qty,
+            'exec_rate': exec_rate,
+            'exec_amount': MoneyColumn(to_paise(exec_amount)),
+            'excess_quantity': excess_qty,
+            'excess_amount': MoneyColumn(to_paise(excess_qty * exec_rate)),
+            'saving_quantity': saving_qty,
+            'saving_amount': MoneyColumn(to_paise(saving_qty * exec_rate))
+        })
+        
+        # Stored in natural item order so templates never need to sort
+        order = np.argsort(self._natural_sort_keys(wo_items.column('item_key')), kind='stable')
+        return deviation.take(order)
+    
+    def _calculate_deductions(self, total_paise: int) -> Dict[str, Any]:
+        """Calculate statutory deductions in whole rupees, see DEDUCTION_RULES"""
+        basis_points, round_to_even = zip(*DEDUCTION_RULES.values())
+        amounts = percentage_to_rupees(total_paise, basis_points, round_to_even).tolist()
         
-        deductions['total_deductions'] = (
-            deductions['sd_amount'] + 
-            deductions['it_amount'] + 
-            deductions['gst_amount'] + 
-            deductions['lc_amount']
-        )
+        deductions = {f'{name}_rate': rate / 100 for name, rate in zip(DEDUCTION_RULES, basis_points)}
+        deductions.update({f'{name}_amount': amount for name, amount in zip(DEDUCTION_RULES, amounts)})
+        deductions['total_deductions'] = sum(amounts)
         
         return deductions
     
-    def _calculate_net_payable(self, total_amount: float) -> float:
+    def _calculate_net_payable(self, total_paise: int, deductions: Dict[str, Any]) -> float:
         """Calculate net payable amount after deductions"""
-        deductions = self._calculate_deductions(total_amount)
-        return total_amount - deductions['total_deductions']
+        return float(to_rupees(total_paise - deductions['total_deductions'] * PAISE_PER_RUPEE))
@@ -1,15 +1,29 @@
-from typing import Any, Union
-import locale
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple, Union
 from datetime import datetime
 
-# Set locale for Indian numbering (if available)
-try:
-    locale.setlocale(locale.LC_ALL, 'en_IN.UTF-8')
-except:
-    try:
-        locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
-    except:
-        pass
+import numpy as np
+
+from utils.money import PAISE_PER_RUPEE, rupees_to_paise, to_paise
+
+# Everything here is a pure function of its arguments: no locale is set and
+# the only shared state is the lookup tables below and lru_caches, so the
+# formatters are safe to call from any number of threads.
+
+# Words for 0-99, built once
+_ONES = ('', 'One', 'Two', 'Three', 'Four', 'Five', 'Six', 'Seven', 'Eight', 'Nine',
+         'Ten', 'Eleven', 'Twelve', 'Thirteen', 'Fourteen', 'Fifteen', 'Sixteen', 'Seventeen', 'Eighteen', 'Nineteen')
+_TENS = ('', '', 'Twenty', 'Thirty', 'Forty', 'Fifty', 'Sixty', 'Seventy', 'Eighty', 'Ninety')
+_BELOW_HUNDRED = tuple(_ONES[n] if n < 20 else f"{_TENS[n // 10]} {_ONES[n % 10]}".rstrip() for n in range(100))
+
+# Indian lakh/crore grouping of plain numbers. format_numbers follows it, and
+# through it the templates' format_number filter and the items' '_fmt' columns;
+# currency amounts are always grouped.
+NUMBER_GROUPING = False
+
+# Indian scale below one crore; larger amounts count crores the same way
+CRORE = 10000000
+_SCALES = ((100000, 'Lakh'), (1000, 'Thousand'), (100, 'Hundred'))
 
 def format_number(value: Any, decimals: int = 2) -> str:
     """Format number with specified decimal places"""
@@ -33,21 +47,55 @@ def format_number(value: Any, decimals: int = 2) -> str:
     return "0.00" if decimals > 0 else "0"
 
 def format_currency(value: Any, symbol: str = "₹") -> str:
-    """Format currency with Indian numbering system"""
+    """Format currency with Indian numbering system (₹12,34,567.89)"""
     try:
         if value is None:
             return f"{symbol}0.00"
         
-        if isinstance(value, (int, float)):
-            # Use Indian numbering system
-            return f"{symbol}{value:,.2f}"
-        elif isinstance(value, str):
-            return f"{symbol}{float(value):,.2f}"
+        if isinstance(value, (int, float, str)):
+            return f"{symbol}{_group_indian(f'{float(value):.2f}')}"
     except:
         pass
     
     return f"{symbol}0.00"
 
+def format_numbers(values: Iterable[float], decimals: int = 2, grouping: Optional[bool] = None) -> List[str]:
+    """Format a whole column of numbers at once, with Indian lakh/crore grouping if asked
+
+    grouping defaults to NUMBER_GROUPING.
+    """
+    texts = [f"{value:.{decimals}f}" for value in np.asarray(values, dtype=np.float64).tolist()]
+    if NUMBER_GROUPING if grouping is None else grouping:
+        texts = [_group_indian(text) for text in texts]
+    return texts
+
+def format_currencies(values: Iterable[float], symbol: str = "₹") -> List[str]:
+    """format_currency for a whole column of amounts"""
+    return [symbol + text for text in format_numbers(values, 2, grouping=True)]
+
+@lru_cache(maxsize=None)
+def _indian_groups(length: int) -> Tuple[slice, ...]:
+    """Slices of the digit groups of a whole number with length digits: 12,34,56,789"""
+    ends = [length]
+    end = length - 3
+    while end > 0:
+        ends.append(end)
+        end -= 2
+    ends.append(0)
+    ends.reverse()
+    return tuple(slice(start, end) for start, end in zip(ends, ends[1:]))
+
+def _group_indian(text: str) -> str:
+    """Insert Indian digit grouping commas into a formatted number ('-1234567.89' -> '-12,34,567.89')"""
+    if text.startswith('-'):
+        return '-' + _group_indian(text[1:])
+    length = text.find('.')
+    if length < 0:
+        length = len(text)
+    if length <= 3 or not text[:length].isdigit():
+        return text
+    return ','.join([text[group] for group in _indian_groups(length)]) + text[length:]
+
 def format_date(date_input: Union[str, datetime], output_format: str = '%d/%m/%Y') -> str:
     """Format date to specified format (default: dd/mm/yyyy)"""
     try:
@@ -120,79 +168,66 @@ def format_indian_number(value: Any) -> str:
     return "0"
 
 def number_to_words(value: Any) -> str:
-    """Convert number to words (Indian format)"""
+    """Convert the whole part of a number to words (Indian format)"""
     try:
         if value is None:
             return "Zero"
         
-        num = int(float(value))
+        num = value if isinstance(value, int) else int(float(value))
         
         if num == 0:
             return "Zero"
-        
-        # Basic implementation for small numbers
-        ones = ["", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine"]
-        tens = ["", "", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety"]
-        teens = ["Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen", "Seventeen", "Eighteen", "Nineteen"]
-        
-        def convert_hundreds(n):
-            result = ""
-            if n >= 100:
-                result += ones[n // 100] + " Hundred "
-                n %= 100
-            
-            if n >= 20:
-                result += tens[n // 10] + " "
-                n %= 10
-            elif n >= 10:
-                result += teens[n - 10] + " "
-                n = 0
-            
-            if n > 0:
-                result += ones[n] + " "
-            
-            return result
-        
-        if num < 1000:
-            return convert_hundreds(num).strip()
-        elif num < 100000:
-            thousands = num // 1000
-            remainder = num % 1000
-            result = convert_hundreds(thousands) + "Thousand "
-            if remainder > 0:
-                result += convert_hundreds(remainder)
-            return result.strip()
-        elif num < 10000000:
-            lakhs = num // 100000
-            remainder = num % 100000
-            result = convert_hundreds(lakhs) + "Lakh "
-            if remainder > 0:
-                if remainder >= 1000:
-                    result += convert_hundreds(remainder // 1000) + "Thousand "
-                    remainder %= 1000
-                if remainder > 0:
-                    result += convert_hundreds(remainder)
-            return result.strip()
-        else:
-            crores = num // 10000000
-            remainder = num % 10000000
-            result = convert_hundreds(crores) + "Crore "
-            if remainder > 0:
-                if remainder >= 100000:
-                    result += convert_hundreds(remainder // 100000) + "Lakh "
-                    remainder %= 100000
-                if remainder >= 1000:
-                    result += convert_hundreds(remainder // 1000) + "Thousand "
-                    remainder %= 1000
-                if remainder > 0:
-                    result += convert_hundreds(remainder)
-            return result.strip()
-    
+        if num < 0:
+            return f"Minus {_whole_words(-num)}"
+        return _whole_words(num)
     except:
         pass
     
     return "Zero"
 
+def amount_to_words(value: Any) -> str:
+    """A rupee amount in words with its paise: 'Rupees Twelve Lakh Five and Paise Fifty Only'"""
+    try:
+        if value is None:
+            return "Rupees Zero Only"
+        return _paise_words(rupees_to_paise(value))
+    except:
+        pass
+    
+    return "Rupees Zero Only"
+
+def amounts_to_words(values: Iterable[float]) -> List[str]:
+    """amount_to_words for a whole column of amounts, each distinct amount converted once"""
+    uniques, codes = np.unique(to_paise(np.asarray(values, dtype=np.float64)), return_inverse=True)
+    words = [_paise_words(paise) for paise in uniques.tolist()]
+    return [words[code] for code in codes.tolist()]
+
+@lru_cache(maxsize=4096)
+def _whole_words(num: int) -> str:
+    """Words of a positive whole number of any size"""
+    if num >= CRORE:
+        crores, rest = divmod(num, CRORE)
+        words = f"{_whole_words(crores)} Crore"
+        return f"{words} {_whole_words(rest)}" if rest else words
+    
+    parts = []
+    for divisor, name in _SCALES:
+        count, num = divmod(num, divisor)
+        if count:
+            parts.append(f"{_BELOW_HUNDRED[count]} {name}")
+    if num:
+        parts.append(_BELOW_HUNDRED[num])
+    return ' '.join(parts)
+
+@lru_cache(maxsize=4096)
+def _paise_words(amount: int) -> str:
+    """Words of an amount given in paise"""
+    rupees, paise = divmod(abs(amount), PAISE_PER_RUPEE)
+    words = f"Rupees {_whole_words(rupees) if rupees else 'Zero'}"
+    if paise:
+        words += f" and Paise {_BELOW_HUNDRED[paise]}"
+    return f"Minus {words} Only" if amount < 0 else f"{words} Only"
+
 def round_to_even(value: Any) -> int:
     """Round to nearest even number (used for GST)"""
     try:
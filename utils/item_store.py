@@ -0,0 +1,256 @@
+import collections
+import functools
+import hashlib
+import itertools
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.formatters import format_numbers
+from utils.money import PAISE_PER_RUPEE
+
+# Suffix of the pre-formatted string column kept beside a number field, and
+# the decimals it is formatted with
+FORMATTED_SUFFIX = '_fmt'
+FORMATTED_DECIMALS = 2
+
+
+class TextColumn(NamedTuple):
+    """Encoded text column: an int32 code per row into a table of distinct strings"""
+    codes: np.ndarray
+    values: np.ndarray
+
+    def decode(self) -> np.ndarray:
+        return self.values[self.codes]
+
+
+class MoneyColumn(NamedTuple):
+    """Amount column held as exact int64 paise and read back as rupees"""
+    paise: np.ndarray
+
+
+@functools.lru_cache(maxsize=None)
+def _row_type(fields: Tuple[str, ...]) -> type:
+    # Named tuple class of ItemStore.rows(), one per field list
+    return collections.namedtuple('ItemValues', fields)
+
+
+class ItemStore:
+    """Column-oriented table of bill items
+
+    Numeric fields are float64 arrays and money fields (MoneyColumn) int64
+    paise. Text fields keep each distinct value once plus an int32 code per
+    row. Iterating yields
+    ItemRow views, so templates and callers can keep treating items as dicts.
+    A TextColumn taken from another store is shared instead of re-encoded.
+    Stores built with the same ``strings`` dict share equal strings through
+    it, such as a description repeated in the work order and the bill; the
+    dict is the caller's and can be dropped once the stores are built.
+    """
+
+    def __init__(self, columns: Dict[str, Any], strings: Optional[Dict[str, str]] = None):
+        self._numeric = {}
+        self._money = {}
+        self._text = {}
+        self._length = None
+
+        for name, values in columns.items():
+            if isinstance(values, TextColumn):
+                self._text[name] = values
+                values = values.codes
+            elif isinstance(values, MoneyColumn):
+                values = self._money[name] = np.asarray(values.paise, dtype=np.int64)
+            else:
+                values = np.asarray(values)
+            if values.ndim != 1:
+                raise ValueError(f"Column '{name}' must be one-dimensional")
+            if self._length is None:
+                self._length = len(values)
+            elif len(values) != self._length:
+                raise ValueError(f"Column '{name}' has {len(values)} rows, expected {self._length}")
+
+            if name in self._text or name in self._money:
+                continue
+            if values.dtype.kind in 'biuf':
+                self._numeric[name] = values.astype(np.float64)
+            else:
+                codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=False)
+                uniques = map(str, uniques)
+                if strings is not None:
+                    uniques = (strings.setdefault(value, value) for value in uniques)
+                self._text[name] = TextColumn(codes.astype(np.int32), np.array(list(uniques), dtype=object))
+
+        self.fields = tuple(columns)
+        self._length = self._length or 0
+
+    @classmethod
+    def from_dicts(cls, records: Sequence[Dict[str, Any]], fields: Sequence[str]) -> 'ItemStore':
+        """Build a store from a list of item dicts"""
+        return cls({name: [record.get(name) for record in records] for name in fields})
+
+    def column(self, name: str) -> np.ndarray:
+        """All values of a field as an array (floats, rupees or strings)"""
+        if name in self._numeric:
+            return self._numeric[name]
+        if name in self._money:
+            return self._money[name] / PAISE_PER_RUPEE
+        return self._text[name].decode()
+
+    def paise(self, name: str) -> np.ndarray:
+        """A money field as exact int64 paise"""
+        return self._money[name]
+
+    def text_column(self, name: str) -> TextColumn:
+        """A text field in encoded form, to share with another store"""
+        return self._text[name]
+
+    def value(self, name: str, index: int) -> Any:
+        """A single value as a plain Python float or str"""
+        if name in self._numeric:
+            return float(self._numeric[name][index])
+        if name in self._money:
+            return int(self._money[name][index]) / PAISE_PER_RUPEE
+        codes, values = self._text[name]
+        return values[codes[index]]
+
+    def rows(self, *fields: str) -> Iterator[tuple]:
+        """The items as named tuples of the given fields, for one pass over them
+
+        Each field is decoded into a Python list for this call only, so
+        templates read whole rows cheaply without the store keeping anything.
+        Fields the store does not have are left out, as missing keys.
+        """
+        fields = tuple(name for name in fields if name in self.fields)
+        columns = [self.column(name).tolist() for name in fields]
+        return map(_row_type(fields)._make, zip(*columns) if columns else itertools.repeat((), self._length))
+
+    def take(self, indices: Union[slice, np.ndarray]) -> 'ItemStore':
+        """A new store with the selected rows (slice, index or mask array)"""
+        return ItemStore(self._columns(indices))
+
+    def formatted(self) -> 'ItemStore':
+        """This store plus a '<field>_fmt' string column for every numeric and money field
+
+        Each distinct value is formatted once by format_numbers, which the
+        format_number filter prints with too (grouping per NUMBER_GROUPING),
+        so templates can emit item.amount_fmt as a ready string.
+        The result is a new store sharing this one's columns and nothing is
+        kept here; a store that already has the columns returns itself.
+        """
+        formatted = {}
+        for name in self.fields:
+            if name + FORMATTED_SUFFIX in self.fields:
+                continue
+            if name in self._money:
+                uniques, codes = np.unique(self._money[name], return_inverse=True)
+                uniques = uniques / PAISE_PER_RUPEE
+            elif name in self._numeric:
+                # Distinct bit patterns, so -0.0 and NaN print as the filter prints them
+                uniques, codes = np.unique(self._numeric[name].view(np.int64), return_inverse=True)
+                uniques = uniques.view(np.float64)
+            else:
+                continue
+            formatted[name + FORMATTED_SUFFIX] = TextColumn(
+                codes.astype(np.int32), np.array(format_numbers(uniques, FORMATTED_DECIMALS), dtype=object))
+        if not formatted:
+            return self
+        return ItemStore({**self._columns(slice(None)), **formatted})
+
+    def formatted_column(self, name: str) -> Optional[TextColumn]:
+        """The pre-formatted strings of a number field, or None if not formatted"""
+        return self._text.get(name + FORMATTED_SUFFIX)
+
+    def _columns(self, indices: Union[slice, np.ndarray]) -> Dict[str, Any]:
+        columns = {}
+        for name in self.fields:
+            if name in self._numeric:
+                columns[name] = self._numeric[name][indices]
+            elif name in self._money:
+                columns[name] = MoneyColumn(self._money[name][indices])
+            else:
+                codes, values = self._text[name]
+                columns[name] = TextColumn(codes[indices], values)
+        return columns
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """The items as a list of plain dicts"""
+        columns = [self.column(name).tolist() for name in self.fields]
+        return [dict(zip(self.fields, row)) for row in zip(*columns)]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns, including distinct strings"""
+        total = sum(values.nbytes for values in [*self._numeric.values(), *self._money.values()])
+        for codes, values in self._text.values():
+            total += codes.nbytes + values.nbytes + sum(sys.getsizeof(value) for value in values)
+        return total
+
+    def fingerprint(self) -> str:
+        """SHA-256 of the field names and column contents, equal for stores with the same items"""
+        digest = hashlib.sha256(b'%d' % self._length)
+        for name in self.fields:
+            digest.update(name.encode('utf-8') + b'\0')
+            if name in self._text:
+                codes, values = self._text[name]
+                digest.update(codes.tobytes())
+                digest.update('\0'.join(str(value) for value in values).encode('utf-8', 'surrogatepass'))
+            else:
+                digest.update((self._money[name] if name in self._money else self._numeric[name]).tobytes())
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator['ItemRow']:
+        for index in range(self._length):
+            yield ItemRow(self, index)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union['ItemRow', 'ItemStore']:
+        if isinstance(key, slice):
+            return self.take(key)
+        index = int(key)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('item index out of range')
+        return ItemRow(self, index)
+
+    def __repr__(self) -> str:
+        return f"ItemStore({self._length} items, fields={list(self.fields)})"
+
+
+class ItemRow(Mapping):
+    """Read-only dict-like view of one row of an ItemStore"""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: ItemStore, index: int):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._store.value(key, self._index)
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __getattr__(self, name: str) -> Any:
+        # Lets templates use item.amount without going through a failed getattr
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._store.value(name, self._index)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.fields)
+
+    def __len__(self) -> int:
+        return len(self._store.fields)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
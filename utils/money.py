@@ -0,0 +1,49 @@
+import math
+
+import numpy as np
+from typing import Any
+
+PAISE_PER_RUPEE = 100
+
+# Rates are given in basis points: 10000 = 100%
+BASIS_POINTS = 10000
+
+
+def to_paise(rupees: Any) -> np.ndarray:
+    """Rupee amounts as int64 paise, rounded half away from zero"""
+    values = np.asarray(rupees, dtype=np.float64) * PAISE_PER_RUPEE
+    # Drop binary noise first, e.g. 1.005 * 100 = 100.49999999999999
+    values = np.round(values, 6)
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+def rupees_to_paise(rupees: float) -> int:
+    """One rupee amount as int paise, rounded exactly as to_paise rounds it
+
+    Plain float arithmetic, for single values where a numpy call would cost
+    more than the rounding itself.
+    """
+    paise = round(float(rupees) * PAISE_PER_RUPEE * 10 ** 6) / 10 ** 6
+    return int(math.copysign(math.floor(abs(paise) + 0.5), paise))
+
+
+def to_rupees(paise: Any) -> Any:
+    """Paise as rupees (float or float array)"""
+    return np.asarray(paise, dtype=np.int64) / PAISE_PER_RUPEE
+
+
+def divide_half_up(numerator: Any, denominator: int) -> np.ndarray:
+    """Exact integer division rounded half away from zero"""
+    numerator = np.asarray(numerator, dtype=np.int64)
+    return np.sign(numerator) * ((np.abs(numerator) * 2 + denominator) // (2 * denominator))
+
+
+def percentage_to_rupees(paise: Any, basis_points: Any, round_to_even: Any = False) -> np.ndarray:
+    """A percentage of paise amounts, rounded half up to whole rupees
+
+    Where round_to_even is set an odd rupee result is raised to the next even
+    rupee. All arguments broadcast, so several rates or bills go in one pass.
+    """
+    rupees = divide_half_up(np.asarray(paise, dtype=np.int64) * np.asarray(basis_points, dtype=np.int64),
+                            BASIS_POINTS * PAISE_PER_RUPEE)
+    return rupees + np.where(round_to_even, rupees % 2, 0)
@@ -0,0 +1,216 @@
+import importlib.util
+import io
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
+
+from utils.buffers import MemoryReader
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A workbook path, its raw bytes or an open binary file
+WorkbookSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+class WorkbookReadError(Exception):
+    """A reader backend could not read a workbook or one of its sheets"""
+
+
+class StreamingWorkbook:
+    """Reads workbook sheets row by row with openpyxl in read-only mode
+
+    Offers the same ``sheet_names`` / ``parse`` interface as ``pd.ExcelFile``
+    so ExcelProcessor can use either. Cell values are streamed straight from
+    the sheet XML and only one sheet is materialized at a time.
+    """
+
+    def __init__(self, source: Any):
+        self.workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        self.sheet_names = self.workbook.sheetnames
+
+    def iter_rows(self, sheet_name: str, max_col: Optional[int] = None) -> Iterator[Tuple[Any, ...]]:
+        """Yield rows of a sheet as tuples of cell values"""
+        worksheet = self.workbook[sheet_name]
+        # Dimensions recorded in the file are often wrong, scan the actual cells
+        worksheet.reset_dimensions()
+        for row in worksheet.iter_rows(max_col=max_col, values_only=True):
+            yield tuple(self._convert_value(value) for value in row)
+
+    def parse(self, sheet_name: str, header: Optional[int] = 0, max_col: Optional[int] = None) -> pd.DataFrame:
+        """Read a sheet into a DataFrame the same way pd.ExcelFile.parse does"""
+        rows = self._trim_rows(self.iter_rows(sheet_name, max_col))
+        if not rows:
+            return pd.DataFrame()
+
+        parser = TextParser(rows, header=header)
+        try:
+            return parser.read()
+        finally:
+            parser.close()
+
+    def close(self):
+        """Release the underlying file handle"""
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _convert_value(self, value: Any) -> Any:
+        """Normalize a raw cell value like pandas' openpyxl reader"""
+        if value is None:
+            return ""
+        if isinstance(value, float):
+            # Whole numbers come back as int, as in pandas
+            if value.is_integer():
+                return int(value)
+            return value
+        if isinstance(value, str) and value in ERROR_CODES:
+            return float('nan')
+        return value
+
+    def _trim_rows(self, rows: Iterator[Tuple[Any, ...]]) -> List[List[Any]]:
+        """Drop trailing empty cells and rows, then pad rows to equal width"""
+        data = []
+        last_row_with_data = -1
+        for row_number, row in enumerate(rows):
+            row = list(row)
+            while row and row[-1] == "":
+                row.pop()
+            if row:
+                last_row_with_data = row_number
+            data.append(row)
+
+        data = data[:last_row_with_data + 1]
+
+        if data:
+            max_width = max(len(row) for row in data)
+            for row in data:
+                if len(row) < max_width:
+                    row.extend([""] * (max_width - len(row)))
+
+        return data
+
+
+class ReaderBackend:
+    """A way of opening workbooks for ExcelProcessor
+
+    ``open`` returns an object with ``sheet_names``, ``parse(sheet, header)``
+    and context manager support (``pd.ExcelFile`` or ``StreamingWorkbook``).
+    """
+
+    name = ''
+    # Set for backends that can only open files on disk
+    requires_path = False
+
+    def is_available(self) -> bool:
+        """Whether the libraries this backend needs are installed"""
+        return True
+
+    def open(self, source: Any):
+        raise NotImplementedError
+
+
+class CalamineBackend(ReaderBackend):
+    """pandas with the Rust calamine engine (python-calamine)"""
+
+    name = 'calamine'
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec('python_calamine') is not None
+
+    def open(self, source: Any) -> pd.ExcelFile:
+        return pd.ExcelFile(source, engine='calamine')
+
+
+class StreamingBackend(ReaderBackend):
+    """openpyxl read-only streaming, see StreamingWorkbook"""
+
+    name = 'streaming'
+
+    def open(self, source: Any) -> StreamingWorkbook:
+        return StreamingWorkbook(source)
+
+
+class OpenpyxlBackend(ReaderBackend):
+    """pandas with the openpyxl engine"""
+
+    name = 'openpyxl'
+
+    def open(self, source: Any) -> pd.ExcelFile:
+        return pd.ExcelFile(source, engine='openpyxl')
+
+
+# Fastest first; 'auto' tries the available ones in this order
+READER_BACKENDS = {backend.name: backend for backend in [CalamineBackend(), StreamingBackend(), OpenpyxlBackend()]}
+
+# Environment variable that forces a single backend when no reader is given
+READER_ENV_VAR = 'EXCEL_READER'
+
+
+def resolve_reader_backends(reader: Optional[str] = None) -> List[ReaderBackend]:
+    """Backends to try in order for a reader setting
+
+    'auto' (the default) returns every installed backend, fastest first, so a
+    failure falls back to the next one. A backend name forces that backend only.
+    """
+    reader = reader or os.environ.get(READER_ENV_VAR) or 'auto'
+
+    if reader == 'auto':
+        return [backend for backend in READER_BACKENDS.values() if backend.is_available()]
+
+    if reader not in READER_BACKENDS:
+        raise ValueError(f"Unknown reader '{reader}', expected 'auto' or one of {list(READER_BACKENDS)}")
+
+    backend = READER_BACKENDS[reader]
+    if not backend.is_available():
+        raise ValueError(f"Reader '{reader}' is not installed")
+    return [backend]
+
+
+def as_readable(source: WorkbookSource) -> Union[str, os.PathLike, BinaryIO]:
+    """A path or rewound binary file for any WorkbookSource
+
+    In-memory sources are wrapped rather than copied: BytesIO shares an
+    immutable bytes object, and other buffers are read through a view.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return io.BufferedReader(MemoryReader(source))
+    source.seek(0)
+    return source
+
+
+@contextmanager
+def workbook_path(source: WorkbookSource) -> Iterator[str]:
+    """A filesystem path for source, spilling in-memory data to a temp file"""
+    if isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = source
+    else:
+        source.seek(0)
+        data = source.read()
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
+        tmp_file.write(data)
+        tmp_path = tmp_file.name
+    try:
+        yield tmp_path
+    finally:
+        os.unlink(tmp_path)
@@ -0,0 +1,212 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory holding one subdirectory per job
+WORKSPACE_ROOT = os.environ.get('WORKSPACE_ROOT') or os.path.join(tempfile.gettempdir(), 'bill_workspace')
+
+# Disk a single job, and all jobs together, may use
+JOB_QUOTA_BYTES = int(os.environ.get('WORKSPACE_JOB_QUOTA_MB', 512)) * 1024 * 1024
+TOTAL_QUOTA_BYTES = int(os.environ.get('WORKSPACE_TOTAL_QUOTA_MB', 2048)) * 1024 * 1024
+
+# Jobs unused for this long are evicted unless leased
+JOB_TTL_SECONDS = int(os.environ.get('WORKSPACE_JOB_TTL', 3600))
+
+SWEEP_INTERVAL_SECONDS = 60
+
+class QuotaExceededError(RuntimeError):
+    """Writing a file would take a job or the workspace past its disk quota"""
+
+class Job:
+    """The directory and artifact stores of one session or batch job
+
+    A job expires JOB_TTL_SECONDS after it was last touched. While a lease
+    is held (a render or package in progress) it is never evicted.
+    """
+
+    def __init__(self, workspace: 'Workspace', path: str):
+        self.workspace = workspace
+        self.path = path
+        self.id = os.path.basename(path)
+        self.created = self.last_used = time.time()
+        self.leases = 0
+        self.closed = False
+        # Bytes of spilled artifacts; these are unlinked files the directory does not list
+        self.tracked_bytes = 0
+        self._stores = weakref.WeakSet()
+
+    def touch(self):
+        """Mark the job as in use, restarting its expiry"""
+        self.last_used = time.time()
+
+    @contextmanager
+    def lease(self) -> Iterator['Job']:
+        """Keep the job from being evicted for the duration of the block"""
+        with self.workspace._lock:
+            if self.closed:
+                raise RuntimeError(f"Workspace job {self.id} has expired")
+            self.leases += 1
+        try:
+            yield self
+        finally:
+            with self.workspace._lock:
+                self.leases -= 1
+            self.touch()
+
+    def add_store(self, store: Any):
+        """Close store (an ArtifactStore) together with the job"""
+        with self.workspace._lock:
+            self._stores.add(store)
+
+    def track_disk(self, delta: int):
+        """Account for bytes written outside the directory listing, checking the quotas"""
+        self.workspace._track(self, delta)
+
+    def usage(self) -> int:
+        """Bytes on disk used by the job"""
+        return _directory_bytes(self.path) + self.tracked_bytes
+
+    def close(self):
+        """Delete the job's files now"""
+        self.workspace.remove(self)
+
+class Workspace:
+    """Job directories under one root, with disk quotas and expiry of idle jobs"""
+
+    def __init__(self, root: str = WORKSPACE_ROOT, job_quota: int = JOB_QUOTA_BYTES,
+                 total_quota: int = TOTAL_QUOTA_BYTES, ttl: float = JOB_TTL_SECONDS):
+        self.root = root
+        self.job_quota = job_quota
+        self.total_quota = total_quota
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.RLock()
+        self._sweeper = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def create_job(self, prefix: str = 'job') -> Job:
+        """New empty job directory"""
+        with self._lock:
+            if self._total_usage() >= self.total_quota:
+                # Make room from expired jobs before refusing
+                self.evict_expired()
+                if self._total_usage() >= self.total_quota:
+                    raise QuotaExceededError(f"Workspace is full ({self.total_quota // (1024 * 1024)} MB)")
+            job = Job(self, tempfile.mkdtemp(prefix=f"{prefix}_", dir=self.root))
+            self._jobs[job.id] = job
+        return job
+
+    def remove(self, job: Job):
+        """Close a job's artifact stores and delete its directory"""
+        with self._lock:
+            if job.closed:
+                return
+            job.closed = True
+            self._jobs.pop(job.id, None)
+            stores = list(job._stores)
+            job._stores = weakref.WeakSet()
+        for store in stores:
+            store.close()
+        shutil.rmtree(job.path, ignore_errors=True)
+
+    def evict_expired(self, now: Optional[float] = None) -> List[str]:
+        """Remove idle, unleased jobs and stale directories left by other processes"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if not job.leases and now - job.last_used > self.ttl]
+            known = set(self._jobs)
+        for job in expired:
+            self.remove(job)
+
+        evicted = [job.id for job in expired]
+        for entry in os.scandir(self.root):
+            if entry.name in known or not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                stale = now - entry.stat(follow_symlinks=False).st_mtime > self.ttl
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                evicted.append(entry.name)
+
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} expired workspace job(s)")
+        return evicted
+
+    def usage(self) -> Dict[str, int]:
+        """Job counts, bytes on disk and quotas"""
+        with self._lock:
+            return {
+                'jobs': len(self._jobs),
+                'leased_jobs': sum(1 for job in self._jobs.values() if job.leases),
+                'bytes': self._total_usage(),
+                'job_quota': self.job_quota,
+                'total_quota': self.total_quota
+            }
+
+    def start_sweeper(self, interval: float = SWEEP_INTERVAL_SECONDS):
+        """Evict expired jobs every interval seconds in a daemon thread"""
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep, args=(interval,),
+                                             name='workspace-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_expired()
+            except Exception as e:
+                logger.error(f"Error evicting workspace jobs: {str(e)}")
+
+    def _track(self, job: Job, delta: int):
+        with self._lock:
+            if delta > 0:
+                if job.usage() + delta > self.job_quota:
+                    raise QuotaExceededError(
+                        f"Job {job.id} would exceed its {self.job_quota // (1024 * 1024)} MB disk quota")
+                if self._total_usage() + delta > self.total_quota:
+                    raise QuotaExceededError(
+                        f"Workspace would exceed its {self.total_quota // (1024 * 1024)} MB disk quota")
+            job.tracked_bytes += delta
+
+    def _total_usage(self) -> int:
+        # Directories of every process sharing the root, plus this process's spilled artifacts
+        return _directory_bytes(self.root) + sum(job.tracked_bytes for job in self._jobs.values())
+
+def _directory_bytes(path: str) -> int:
+    """Total size of the files under path"""
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                pass
+    return total
+
+_workspace = None
+_workspace_lock = threading.Lock()
+
+def get_workspace() -> Workspace:
+    """The process-wide workspace, sweeping expired jobs in the background"""
+    global _workspace
+    with _workspace_lock:
+        if _workspace is None:
+            _workspace = Workspace()
+            _workspace.start_sweeper()
+        return _workspace